@@ -0,0 +1,440 @@
+"""
+Analytics colunar em memória sobre os logs de acesso recentes
+
+Mantém uma janela móvel dos eventos de acesso em colunas NumPy compactas
+(~49 bytes por evento, alocados à medida que a janela cresce) para responder filtros, agrupamentos e top-N com
+operações vetorizadas, sem consultar o banco principal:
+
+  • timestamp      int64   (microssegundos desde a época, UTC)
+  • event_type     int8    (índice em EventType)
+  • location       int32   (código internado)
+  • card_id        int32   (código internado, -1 quando desconhecido)
+  • user_id        2×uint64 (UUID como inteiro de 128 bits)
+  • credential_id  2×uint64 (UUID como inteiro de 128 bits)
+
+A janela é alimentada pelo mesmo caminho que grava `AccessLog`. Como cada
+worker enxerga apenas os próprios eventos, ela é atualizada a partir do banco
+quando fica mais antiga que a tolerância configurada: a primeira consulta
+carrega a janela inteira e as seguintes leem apenas os eventos posteriores à
+última carga (com REFRESH_OVERLAP_SECONDS de sobreposição para transações que
+confirmam depois de eventos mais novos). Os eventos alimentados localmente
+desde a última carga são então substituídos pelas linhas do banco.
+
+O lock protege apenas a escrita e a tomada do tamanho atual: consultas
+filtram e agrupam sobre visões das colunas fora dele, para que um relatório
+sobre a janela inteira não atrase o registro das decisões de acesso.
+"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Dict, List, Optional
+import threading
+import time
+import uuid
+
+from sqlalchemy import BigInteger, LargeBinary, cast, func, literal, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import AccessLog, EventType, RFIDCredential
+
+if TYPE_CHECKING:
+    import numpy as np
+
+EVENT_TYPES = list(EventType)
+EVENT_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+GROUP_BY_FIELDS = ("location", "event_type", "card_id", "user_id", "rfid_credential_id")
+
+_LOW_MASK = (1 << 64) - 1
+_NULL_UUID = b"\x00" * 16
+
+REFRESH_OVERLAP_SECONDS = 30
+# Posições alocadas inicialmente; as colunas dobram conforme necessário, até a capacidade
+INITIAL_ROWS = 16_384
+FETCH_CHUNK_SIZE = 50_000
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_micros(value: datetime) -> int:
+    """Converter datetime em microssegundos desde a época (datetimes sem fuso são tratados como UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=int(value))
+
+
+def uuid_to_parts(value) -> tuple:
+    """Dividir um UUID em duas metades de 64 bits ((0, 0) quando ausente)"""
+    if value is None:
+        return 0, 0
+    number = value.int if isinstance(value, uuid.UUID) else uuid.UUID(str(value)).int
+    return number >> 64, number & _LOW_MASK
+
+
+def parts_to_uuid(hi, lo) -> Optional[uuid.UUID]:
+    hi, lo = int(hi), int(lo)
+    if hi == 0 and lo == 0:
+        return None
+    return uuid.UUID(int=(hi << 64) | lo)
+
+
+class Interner:
+    """Tabela de strings internadas: string -> código int32 e vice-versa"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def intern_many(self, values) -> "np.ndarray":
+        """Códigos de uma coluna inteira, internando cada valor distinto uma única vez"""
+        import numpy as np
+        codes = {value: self.intern(value) for value in dict.fromkeys(values)}
+        return np.fromiter(map(codes.__getitem__, values), dtype=np.int32, count=len(values))
+
+
+def allocate_columns(length: int) -> tuple:
+    """Colunas vazias (timestamp, event, location, card, user, credential) com `length` posições"""
+    import numpy as np
+    return (
+        np.zeros(length, dtype=np.int64), np.zeros(length, dtype=np.int8),
+        np.zeros(length, dtype=np.int32), np.zeros(length, dtype=np.int32),
+        np.zeros((length, 2), dtype=np.uint64), np.zeros((length, 2), dtype=np.uint64)
+    )
+
+
+class AccessEventWindow:
+    """Janela móvel de eventos de acesso em layout colunar"""
+
+    def __init__(self, capacity: int, window_hours: int):
+        self.capacity = capacity
+        self.window_hours = window_hours
+        self.loaded_at: Optional[float] = None
+        # Maior timestamp já lido do banco (microssegundos)
+        self._loaded_until: Optional[int] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._size = 0
+        # Eventos [0, _db_size) vieram do banco, em ordem cronológica; os demais foram alimentados localmente
+        self._db_size = 0
+        self._locations = Interner()
+        self._cards = Interner()
+        # Colunas (timestamp, event, location, card, user, credential), alocadas na primeira carga
+        # (numpy é importado apenas então). As linhas [0, _size) nunca são alteradas no lugar:
+        # compactação e carga montam colunas novas e as trocam, então as consultas leem sem o lock
+        self._buffers = None
+        # Incrementado a cada troca de colunas
+        self._generation = 0
+
+    def _swap(self, buffers: tuple, size: int):
+        """Publicar novas colunas (com o lock)"""
+        self._buffers = buffers
+        self._size = size
+        self._generation += 1
+
+    def _buffer_length(self, rows: int) -> int:
+        """Tamanho das colunas para `rows` eventos: INITIAL_ROWS dobrado até caber, limitado à capacidade"""
+        length = min(INITIAL_ROWS, self.capacity)
+        while length < rows:
+            length *= 2
+        return min(length, self.capacity)
+
+    def __len__(self):
+        return self._size
+
+    # --------------------------
+    # Escrita
+    # --------------------------
+    def _compact(self, now_micros: int):
+        """Descartar eventos fora da janela; se ainda estiver cheia, manter a metade mais recente"""
+        size = self._size
+        cutoff = now_micros - self.window_hours * 3600 * 1_000_000
+        start = int(self._buffers[0][:size].searchsorted(cutoff, side="left"))
+        start = max(start, size - self.capacity // 2)
+        keep = size - start
+        buffers = allocate_columns(self.capacity)
+        for target, source in zip(buffers, self._buffers):
+            target[:keep] = source[start:size]
+        self._db_size = max(0, self._db_size - start)
+        self._swap(buffers, keep)
+
+    def _grow(self):
+        """Dobrar as colunas, copiando os eventos atuais"""
+        size = self._size
+        buffers = allocate_columns(self._buffer_length(size + 1))
+        for target, source in zip(buffers, self._buffers):
+            target[:size] = source[:size]
+        self._swap(buffers, size)
+
+    def record(self, event_type, location: str, card_id: Optional[str] = None,
+               user_id=None, credential_id=None, timestamp: Optional[datetime] = None):
+        """
+        Acrescentar um evento (chamado logo após gravar o AccessLog). Antes da primeira
+        carga o evento é ignorado: ele já está no banco e entra na carga, e workers que
+        nunca recebem consultas analíticas não importam numpy nem alocam a janela
+        """
+        if self._buffers is None:
+            return
+        micros = to_micros(timestamp or datetime.now(timezone.utc))
+        event = EVENT_CODES[EventType(event_type)]
+        user, credential = uuid_to_parts(user_id), uuid_to_parts(credential_id)
+        with self._lock:
+            if self._size == len(self._buffers[0]):
+                if self._size < self.capacity:
+                    self._grow()
+                else:
+                    self._compact(micros)
+            index = self._size
+            timestamps, events, locations, cards, users, credentials = self._buffers
+            timestamps[index] = micros
+            events[index] = event
+            locations[index] = self._locations.intern(location)
+            cards[index] = self._cards.intern(card_id)
+            users[index] = user
+            credentials[index] = credential
+            self._size = index + 1
+
+    def _fetch(self, db: Session, since_micros: int) -> list:
+        """
+        Eventos com timestamp posterior a `since_micros` (no máximo `capacity`, os mais
+        recentes), em colunas brutas por bloco: timestamps e UUIDs já vêm convertidos
+        pelo banco para montar os arrays sem processamento por linha em Python
+        """
+        null_uuid = literal(_NULL_UUID, LargeBinary)
+        stmt = (
+            select(
+                cast(func.extract("epoch", AccessLog.timestamp) * 1_000_000, BigInteger),
+                AccessLog.event_type, AccessLog.location, RFIDCredential.card_id,
+                func.coalesce(func.uuid_send(AccessLog.user_id), null_uuid),
+                func.coalesce(func.uuid_send(AccessLog.rfid_credential_id), null_uuid)
+            )
+            .outerjoin(RFIDCredential, AccessLog.rfid_credential_id == RFIDCredential.id)
+            .where(AccessLog.timestamp > from_micros(since_micros))
+            .order_by(AccessLog.timestamp.desc())
+            .limit(self.capacity)
+        )
+        # Executa na conexão (Core), sem a camada de carregamento do ORM por linha
+        result = db.connection().execute(stmt.execution_options(yield_per=FETCH_CHUNK_SIZE))
+        return [list(zip(*chunk)) for chunk in result.partitions()]
+
+    @staticmethod
+    def _encode(chunks: list, locations: Interner, cards: Interner) -> tuple:
+        """Montar as colunas (em ordem cronológica) a partir dos blocos de _fetch"""
+        import numpy as np
+        encoded = ([], [], [], [], [], [])
+        for timestamps, events, location_values, card_values, users, credentials in chunks:
+            count = len(timestamps)
+            encoded[0].append(np.fromiter(timestamps, dtype=np.int64, count=count))
+            encoded[1].append(np.fromiter(map(EVENT_CODES.__getitem__, events), dtype=np.int8, count=count))
+            encoded[2].append(locations.intern_many(location_values))
+            encoded[3].append(cards.intern_many(card_values))
+            encoded[4].append(np.frombuffer(b"".join(users), dtype=">u8").reshape(count, 2).astype(np.uint64))
+            encoded[5].append(np.frombuffer(b"".join(credentials), dtype=">u8").reshape(count, 2).astype(np.uint64))
+        empty = allocate_columns(0)
+        # A consulta vem do mais recente para o mais antigo; a janela é mantida em ordem cronológica
+        return tuple(
+            (np.concatenate(parts) if parts else blank)[::-1]
+            for parts, blank in zip(encoded, empty)
+        )
+
+    def _build(self, source: Optional[tuple], keep_start: int, keep_end: int, columns: tuple) -> tuple:
+        """Colunas novas com os eventos [keep_start, keep_end) de `source` seguidos de `columns`"""
+        keep = keep_end - keep_start
+        count = len(columns[0])
+        buffers = allocate_columns(self._buffer_length(keep + count))
+        for index, (target, column) in enumerate(zip(buffers, columns)):
+            if keep:
+                target[:keep] = source[index][keep_start:keep_end]
+            target[keep:keep + count] = column
+        return buffers
+
+    def _install(self, buffers: tuple, size: int, columns: tuple):
+        """Publicar colunas vindas do banco (com o lock); eventos locais não confirmados são descartados"""
+        self._db_size = size
+        self._swap(buffers, size)
+        if len(columns[0]):
+            self._loaded_until = max(self._loaded_until or 0, int(columns[0][-1]))
+        self.loaded_at = time.monotonic()
+
+    def _window_start_micros(self) -> int:
+        return to_micros(datetime.now(timezone.utc) - timedelta(hours=self.window_hours))
+
+    def reload(self, db: Session):
+        """Recarregar a janela inteira a partir do banco"""
+        since = self._window_start_micros()
+        # Monta as colunas com interners novos, sem bloquear o caminho de escrita durante a consulta
+        locations, cards = Interner(), Interner()
+        columns = self._encode(self._fetch(db, since), locations, cards)
+        buffers = self._build(None, 0, 0, columns)
+        with self._lock:
+            self._locations, self._cards = locations, cards
+            self._loaded_until = since
+            self._install(buffers, len(columns[0]), columns)
+
+    def _keep_range(self, since: int, count: int) -> tuple:
+        """Eventos do banco a manter em uma carga incremental de `count` eventos posteriores a `since`"""
+        timestamps = self._buffers[0][:self._db_size]
+        # Descarta a sobreposição (relida do banco), os eventos locais e os que saíram da janela
+        keep_end = int(timestamps.searchsorted(since, side="right"))
+        keep_start = int(timestamps[:keep_end].searchsorted(self._window_start_micros(), side="left"))
+        keep_start = max(keep_start, keep_end + count - self.capacity)
+        return min(keep_start, keep_end), keep_end
+
+    def refresh(self, db: Session):
+        """Ler do banco apenas os eventos posteriores à última carga (a primeira carga é completa)"""
+        if self._loaded_until is None:
+            self.reload(db)
+            return
+        since = self._loaded_until - REFRESH_OVERLAP_SECONDS * 1_000_000
+        chunks = self._fetch(db, since)
+        with self._lock:
+            # Os interners só mudam com o lock (record também interna)
+            columns = self._encode(chunks, self._locations, self._cards)
+            source, generation = self._buffers, self._generation
+            keep_start, keep_end = self._keep_range(since, len(columns[0]))
+        # A cópia é feita fora do lock: as linhas de `source` abaixo de _size não mudam
+        buffers = self._build(source, keep_start, keep_end, columns)
+        with self._lock:
+            if generation != self._generation:
+                # Uma compactação trocou as colunas no meio tempo: recalcula com o lock
+                keep_start, keep_end = self._keep_range(since, len(columns[0]))
+                buffers = self._build(self._buffers, keep_start, keep_end, columns)
+            self._install(buffers, keep_end - keep_start + len(columns[0]), columns)
+
+    def is_stale(self, max_staleness_seconds: int) -> bool:
+        if self.loaded_at is None:
+            return True
+        return max_staleness_seconds > 0 and time.monotonic() - self.loaded_at > max_staleness_seconds
+
+    def refresh_if_stale(self, db: Session, max_staleness_seconds: int):
+        """Atualizar a partir do banco, uma requisição por vez, se a janela estiver desatualizada"""
+        if not self.is_stale(max_staleness_seconds):
+            return
+        with self._refresh_lock:
+            # Outra requisição pode ter atualizado enquanto esta aguardava
+            if self.is_stale(max_staleness_seconds):
+                self.refresh(db)
+
+    # --------------------------
+    # Consultas
+    # --------------------------
+    def _snapshot(self) -> Optional[SimpleNamespace]:
+        """
+        Visões das colunas até o tamanho atual, tomadas com o lock. O restante da consulta
+        roda fora dele: eventos só são acrescentados depois de _size e trocas publicam colunas novas
+        """
+        with self._lock:
+            size = self._size
+            if size == 0:
+                return None
+            timestamp, event, location, card, user, credential = (column[:size] for column in self._buffers)
+            return SimpleNamespace(
+                size=size, timestamp=timestamp, event=event, location=location, card=card,
+                user=user, credential=credential, locations=self._locations, cards=self._cards
+            )
+
+    @staticmethod
+    def _mask(view: SimpleNamespace, start_date, end_date, location, event_type, card_id, user_id) -> Optional["np.ndarray"]:
+        """Máscara booleana dos filtros; None quando algum filtro não pode casar"""
+        import numpy as np
+        mask = np.ones(view.size, dtype=bool)
+        if start_date is not None:
+            mask &= view.timestamp >= to_micros(start_date)
+        if end_date is not None:
+            mask &= view.timestamp <= to_micros(end_date)
+        if location is not None:
+            code = view.locations.codes.get(location)
+            if code is None:
+                return None
+            mask &= view.location == code
+        if event_type is not None:
+            mask &= view.event == EVENT_CODES[EventType(event_type)]
+        if card_id is not None:
+            code = view.cards.codes.get(card_id)
+            if code is None:
+                return None
+            mask &= view.card == code
+        if user_id is not None:
+            hi, lo = uuid_to_parts(user_id)
+            mask &= (view.user[:, 0] == hi) & (view.user[:, 1] == lo)
+        return mask
+
+    @staticmethod
+    def _event_at(view: SimpleNamespace, index: int) -> dict:
+        card = int(view.card[index])
+        return {
+            "timestamp": from_micros(view.timestamp[index]),
+            "event_type": EVENT_TYPES[view.event[index]],
+            "location": view.locations.values[view.location[index]],
+            "card_id": view.cards.values[card] if card >= 0 else None,
+            "user_id": parts_to_uuid(*view.user[index]),
+            "rfid_credential_id": parts_to_uuid(*view.credential[index])
+        }
+
+    def query(self, limit: int = 100, start_date=None, end_date=None, location=None,
+              event_type=None, card_id=None, user_id=None) -> List[dict]:
+        """Eventos que casam com os filtros, do mais recente para o mais antigo"""
+        view = self._snapshot()
+        if view is None:
+            return []
+        mask = self._mask(view, start_date, end_date, location, event_type, card_id, user_id)
+        if mask is None:
+            return []
+        indices = mask.nonzero()[0][::-1][:limit]
+        return [self._event_at(view, i) for i in indices]
+
+    def top(self, group_by: str, limit: int = 10, min_count: int = 1, start_date=None, end_date=None,
+            location=None, event_type=None, card_id=None, user_id=None) -> List[dict]:
+        """Contagem por grupo (top-N), opcionalmente apenas grupos com pelo menos min_count eventos"""
+        if group_by not in GROUP_BY_FIELDS:
+            raise ValueError(f"group_by inválido: {group_by}")
+        import numpy as np
+        view = self._snapshot()
+        if view is None:
+            return []
+        mask = self._mask(view, start_date, end_date, location, event_type, card_id, user_id)
+        if mask is None:
+            return []
+
+        if group_by in ("user_id", "rfid_credential_id"):
+            values = (view.user if group_by == "user_id" else view.credential)[mask]
+            values = values[(values[:, 0] != 0) | (values[:, 1] != 0)]
+            if len(values) == 0:
+                return []
+            keys, counts = np.unique(values, axis=0, return_counts=True)
+            labels = [str(parts_to_uuid(hi, lo)) for hi, lo in keys]
+        else:
+            if group_by == "location":
+                codes, names = view.location[mask], view.locations.values
+            elif group_by == "card_id":
+                codes, names = view.card[mask], view.cards.values
+            else:
+                codes, names = view.event[mask].astype(np.int32), [e.value for e in EVENT_TYPES]
+            codes = codes[codes >= 0]
+            counts = np.bincount(codes, minlength=len(names))
+            labels = names
+
+        selected = np.flatnonzero(counts >= max(min_count, 1))
+        order = selected[np.argsort(counts[selected], kind="stable")[::-1]][:limit]
+        return [{"key": labels[i], "count": int(counts[i])} for i in order]
+
+
+access_analytics = AccessEventWindow(settings.ACCESS_ANALYTICS_CAPACITY, settings.ACCESS_ANALYTICS_WINDOW_HOURS)
+
+
+def ensure_fresh(db: Session):
+    """Atualizar a janela a partir do banco se ela estiver mais antiga que a tolerância configurada"""
+    access_analytics.refresh_if_stale(db, settings.ACCESS_ANALYTICS_MAX_STALENESS_SECONDS)
@@ -0,0 +1,298 @@
+"""
+Arquivamento de logs de acesso em armazenamento frio comprimido
+
+Logs de acesso mais antigos que ACCESS_LOG_HOT_DAYS saem do PostgreSQL e vão
+para arquivos NDJSON comprimidos com zstd, particionados por data (UTC):
+
+    <ACCESS_LOG_ARCHIVE_DIR>/access_logs/
+        manifest.json
+        date=2024-01-31/part-<arquivado_em>-<id>.ndjson.zst
+
+O manifesto lista cada arquivo com data, quantidade de linhas e intervalo de
+timestamps, o que permite ler apenas as partições de um intervalo consultado.
+Consultas paginadas leem as partições da mais recente para a mais antiga e
+param assim que nenhuma partição restante pode alterar a página pedida.
+Cada dia é gravado e registrado no manifesto antes das linhas serem apagadas
+do banco; se o processo cair entre as duas etapas, as linhas duplicadas são
+descartadas na leitura (por id).
+
+O arquivamento deve rodar em um único lugar: o host que monta o
+ACCESS_LOG_ARCHIVE_DIR lido pela API (via cron com
+scripts/archive_access_logs.py ou, nesse host, com
+ACCESS_LOG_ARCHIVE_INTERVAL_SECONDS > 0). Um advisory lock no PostgreSQL
+impede que dois processos, mesmo em hosts diferentes, arquivem ao mesmo tempo.
+"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Iterator, List, Optional
+import fcntl
+import heapq
+import io
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import zstandard
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import AccessLog, EventType
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_ROOT = os.path.join(settings.ACCESS_LOG_ARCHIVE_DIR, "access_logs")
+MANIFEST_PATH = os.path.join(ARCHIVE_ROOT, "manifest.json")
+LOCK_PATH = os.path.join(ARCHIVE_ROOT, ".lock")
+
+DELETE_CHUNK_SIZE = 10_000
+# Chave do advisory lock que serializa o arquivamento entre hosts
+ARCHIVE_ADVISORY_LOCK_KEY = 0x5AFE_A4C1
+
+
+def hot_window_start() -> datetime:
+    """Início da janela quente: logs anteriores a este instante podem estar arquivados"""
+    return datetime.now(timezone.utc) - timedelta(days=settings.ACCESS_LOG_HOT_DAYS)
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def needs_archive(start_date: Optional[datetime]) -> bool:
+    """Consultas cujo start_date cai antes da janela quente também precisam ler o arquivo"""
+    return start_date is not None and _as_utc(start_date) < hot_window_start()
+
+
+# --------------------------
+# Manifesto
+# --------------------------
+def read_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"partitions": []}
+
+
+def _write_manifest(manifest: dict):
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+# --------------------------
+# Escrita
+# --------------------------
+def _serialize(row: AccessLog) -> bytes:
+    return json.dumps({
+        "id": str(row.id),
+        "user_id": str(row.user_id) if row.user_id else None,
+        "rfid_credential_id": str(row.rfid_credential_id) if row.rfid_credential_id else None,
+        "event_type": row.event_type.value,
+        "location": row.location,
+        "description": row.description,
+        "timestamp": row.timestamp.isoformat()
+    }, ensure_ascii=False).encode() + b"\n"
+
+
+def _archive_day(db: Session, day_start: datetime, day_end: datetime) -> int:
+    """Gravar os logs de [day_start, day_end) em uma partição e apagá-los do banco"""
+    partition = f"date={day_start.date().isoformat()}"
+    os.makedirs(os.path.join(ARCHIVE_ROOT, partition), exist_ok=True)
+    file_name = f"part-{int(time.time())}-{uuid.uuid4().hex[:8]}.ndjson.zst"
+    relative_path = os.path.join(partition, file_name)
+    path = os.path.join(ARCHIVE_ROOT, relative_path)
+
+    rows = db.execute(
+        select(AccessLog)
+        .where(AccessLog.timestamp >= day_start, AccessLog.timestamp < day_end)
+        .order_by(AccessLog.timestamp)
+        .execution_options(yield_per=10_000)
+    ).scalars()
+
+    ids = []
+    min_timestamp = max_timestamp = None
+    with open(f"{path}.tmp", "wb") as raw:
+        writer = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False)
+        for row in rows:
+            writer.write(_serialize(row))
+            ids.append(row.id)
+            min_timestamp = min_timestamp or row.timestamp
+            max_timestamp = row.timestamp
+        writer.flush(zstandard.FLUSH_FRAME)
+        writer.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    if not ids:
+        os.remove(f"{path}.tmp")
+        return 0
+    os.replace(f"{path}.tmp", path)
+
+    manifest = read_manifest()
+    manifest["partitions"].append({
+        "date": day_start.date().isoformat(),
+        "file": relative_path,
+        "rows": len(ids),
+        "min_timestamp": min_timestamp.isoformat(),
+        "max_timestamp": max_timestamp.isoformat()
+    })
+    _write_manifest(manifest)
+
+    for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+        db.execute(delete(AccessLog).where(AccessLog.id.in_(ids[i:i + DELETE_CHUNK_SIZE])))
+    db.commit()
+    return len(ids)
+
+
+def archive_access_logs(db: Session) -> int:
+    """
+    Mover para o arquivo os dias completos anteriores à janela quente.
+    Apenas um processo arquiva por vez (flock no host e advisory lock no banco);
+    os demais retornam 0.
+    """
+    os.makedirs(ARCHIVE_ROOT, exist_ok=True)
+    cutoff = datetime.combine(hot_window_start().date(), datetime.min.time(), tzinfo=timezone.utc)
+
+    with open(LOCK_PATH, "a") as lock_file, db.get_bind().connect() as lock_conn:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        # Conexão própria: a sessão devolve a sua ao pool a cada commit
+        if not lock_conn.execute(select(func.pg_try_advisory_lock(ARCHIVE_ADVISORY_LOCK_KEY))).scalar():
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            logger.warning("Arquivamento já em andamento em outro processo/host")
+            return 0
+        try:
+            archived = 0
+            while True:
+                oldest = db.execute(
+                    select(func.min(AccessLog.timestamp)).where(AccessLog.timestamp < cutoff)
+                ).scalar()
+                if oldest is None:
+                    break
+                day_start = datetime.combine(_as_utc(oldest).astimezone(timezone.utc).date(),
+                                             datetime.min.time(), tzinfo=timezone.utc)
+                day_end = min(day_start + timedelta(days=1), cutoff)
+                archived += _archive_day(db, day_start, day_end)
+            return archived
+        finally:
+            lock_conn.execute(select(func.pg_advisory_unlock(ARCHIVE_ADVISORY_LOCK_KEY)))
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# --------------------------
+# Leitura
+# --------------------------
+def _partition_overlaps(partition: dict, start_date: Optional[datetime], end_date: Optional[datetime]) -> bool:
+    if start_date is not None and datetime.fromisoformat(partition["max_timestamp"]) < start_date:
+        return False
+    if end_date is not None and datetime.fromisoformat(partition["min_timestamp"]) > end_date:
+        return False
+    return True
+
+
+def _read_partition(partition: dict, start_date: Optional[datetime], end_date: Optional[datetime]) -> Iterator[SimpleNamespace]:
+    with open(os.path.join(ARCHIVE_ROOT, partition["file"]), "rb") as raw:
+        reader = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw), encoding="utf-8")
+        for line in reader:
+            record = json.loads(line)
+            timestamp = datetime.fromisoformat(record["timestamp"])
+            if start_date is not None and timestamp < start_date:
+                continue
+            if end_date is not None and timestamp > end_date:
+                continue
+            yield SimpleNamespace(
+                id=uuid.UUID(record["id"]),
+                user_id=uuid.UUID(record["user_id"]) if record["user_id"] else None,
+                rfid_credential_id=uuid.UUID(record["rfid_credential_id"]) if record["rfid_credential_id"] else None,
+                event_type=EventType(record["event_type"]),
+                location=record["location"],
+                description=record["description"],
+                timestamp=timestamp
+            )
+
+
+def _partitions_newest_first(start_date: Optional[datetime], end_date: Optional[datetime]) -> List[dict]:
+    partitions = [
+        partition for partition in read_manifest()["partitions"]
+        if _partition_overlaps(partition, start_date, end_date)
+    ]
+    partitions.sort(key=lambda partition: partition["max_timestamp"], reverse=True)
+    return partitions
+
+
+def scan_archive(start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[SimpleNamespace]:
+    """Ler do arquivo os logs de acesso no intervalo [start_date, end_date]"""
+    start_date = _as_utc(start_date) if start_date else None
+    end_date = _as_utc(end_date) if end_date else None
+
+    results = []
+    for partition in _partitions_newest_first(start_date, end_date):
+        results.extend(_read_partition(partition, start_date, end_date))
+    return results
+
+
+def merge_with_archive(hot_rows: list, start_date: Optional[datetime], end_date: Optional[datetime],
+                       limit: Optional[int] = None) -> list:
+    """
+    Combinar resultados do banco com o arquivo, do mais recente para o mais antigo, sem duplicatas.
+    Com `limit`, retorna apenas as `limit` linhas mais recentes e lê só as partições
+    necessárias: a leitura para quando a próxima partição é inteiramente mais antiga
+    que a `limit`-ésima linha já coletada.
+    """
+    start_date = _as_utc(start_date) if start_date else None
+    end_date = _as_utc(end_date) if end_date else None
+
+    merged = {row.id: row for row in hot_rows}
+    for partition in _partitions_newest_first(start_date, end_date):
+        if limit is not None and len(merged) >= limit:
+            threshold = heapq.nlargest(limit, (row.timestamp for row in merged.values()))[-1]
+            if datetime.fromisoformat(partition["max_timestamp"]) < threshold:
+                break
+        for row in _read_partition(partition, start_date, end_date):
+            # Linha ainda no banco (arquivamento interrompido) prevalece sobre a cópia arquivada
+            merged.setdefault(row.id, row)
+    rows = sorted(merged.values(), key=lambda row: row.timestamp, reverse=True)
+    return rows if limit is None else rows[:limit]
+
+
+# --------------------------
+# Execução periódica
+# --------------------------
+def _archive_periodically(session_factory, interval_seconds: int):
+    while True:
+        time.sleep(interval_seconds)
+        db = session_factory()
+        try:
+            archived = archive_access_logs(db)
+            if archived:
+                logger.info("%s logs de acesso arquivados", archived)
+        except Exception:
+            logger.exception("Falha ao arquivar logs de acesso")
+            db.rollback()
+        finally:
+            db.close()
+
+
+def start_archiver(session_factory):
+    """
+    Iniciar o arquivamento periódico em background (ACCESS_LOG_ARCHIVE_INTERVAL_SECONDS > 0).
+    Desligado por padrão: habilite apenas no host designado para arquivar.
+    """
+    if settings.ACCESS_LOG_ARCHIVE_INTERVAL_SECONDS <= 0:
+        return
+    threading.Thread(
+        target=_archive_periodically,
+        args=(session_factory, settings.ACCESS_LOG_ARCHIVE_INTERVAL_SECONDS),
+        daemon=True
+    ).start()
@@ -0,0 +1,90 @@
+"""
+Cache de respostas HTTP com ETag
+
+Para recursos que mudam poucas vezes ao dia (usuários e credenciais RFID),
+o ETag é derivado da coluna `version` das linhas, incrementada no próprio
+UPDATE (o `updated_at` registra o início da transação e não é monotônico
+entre transações concorrentes). Isso permite responder 304 a
+`If-None-Match` sem serializar nada. Os corpos já
+serializados ficam memorizados em um LRU limitado por tamanho em bytes.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+import hashlib
+import threading
+
+from fastapi import Request, Response
+
+from app.config import settings
+
+CacheKey = Tuple[str, ...]
+
+
+class ResponseCache:
+    """LRU de corpos serializados, limitado pelo total de bytes armazenados"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, Tuple[str, bytes]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey, etag: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: CacheKey, etag: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[key] = (etag, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def invalidate(self, namespace: str):
+        """Remover todas as entradas de um namespace (ex.: "users", "rfid")"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == namespace]:
+                self._size -= len(self._entries.pop(key)[1])
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_BYTES)
+
+
+def make_etag(*parts) -> str:
+    """ETag forte a partir de identificadores e versões (timestamps) das linhas"""
+    raw = "|".join(p.isoformat() if isinstance(p, datetime) else str(p) for p in parts)
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in [tag.strip() for tag in header.split(",")]
+
+
+def cached_response(request: Request, key: CacheKey, etag: str, render: Callable[[], bytes]) -> Response:
+    """Responder 304, o corpo memorizado ou um corpo recém-serializado para o ETag informado"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key, etag)
+    if body is None:
+        body = render()
+        response_cache.set(key, etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,300 @@
+"""
+Índice compacto de credenciais RFID em memória
+
+Layout struct-of-arrays (NumPy) em vez de um objeto `RFIDCredential` + `User`
+do SQLAlchemy por cartão:
+
+Credenciais (ordenadas por card_id, busca binária):
+  • card_ids        S<w>      card_id em bytes de largura fixa w
+  • credential_ids  2×uint64  UUID como inteiro de 128 bits
+  • user_index      int32     posição do usuário na tabela de usuários
+  • window_start    int16     minutos desde meia-noite (-1 = sem janela); janela
+                              efetiva: a do perfil de horário ou a própria
+  • window_end      int16
+  • flags           uint8     FLAG_TIME_RESTRICTED
+
+Usuários (nomes e e-mails internados, um registro por usuário):
+  • user_ids        2×uint64
+  • user_flags      uint8     FLAG_USER_ACTIVE
+  • name_offsets / name_data, email_offsets / email_data   (UTF-8 concatenado)
+
+Orçamento de memória: FIXED_BYTES_PER_CREDENTIAL + w bytes por credencial e
+FIXED_BYTES_PER_USER + len(nome) + len(e-mail) por usuário. Para dados típicos
+(card_id até 16 bytes, nome + e-mail até 60 bytes, um cartão por usuário) isso
+fica abaixo de BYTES_PER_CREDENTIAL_BUDGET; ver scripts/check_credential_index_memory.py.
+
+O índice pode ser gravado em um único arquivo e reaberto via mmap (leitura
+sem cópia), o que permite compartilhá-lo entre workers do mesmo host.
+"""
+
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+import json
+import mmap
+import os
+import struct
+import uuid
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import RFIDCredential, TimeWindowProfile, User
+
+if TYPE_CHECKING:
+    import numpy as np
+
+FLAG_TIME_RESTRICTED = 1
+FLAG_USER_ACTIVE = 1
+NO_WINDOW = -1
+
+FIXED_BYTES_PER_CREDENTIAL = 16 + 4 + 2 + 2 + 1
+FIXED_BYTES_PER_USER = 16 + 1 + 4 + 4
+BYTES_PER_CREDENTIAL_BUDGET = 128
+
+FILE_MAGIC = b"SWCIDX01"
+_ALIGNMENT = 64
+_LOW_MASK = (1 << 64) - 1
+
+
+def window_to_minutes(value: Optional[str]) -> int:
+    """Converter "HH:MM" em minutos desde meia-noite (-1 quando ausente ou inválido)"""
+    if not value:
+        return NO_WINDOW
+    try:
+        hours, minutes = map(int, value.split(":"))
+    except ValueError:
+        return NO_WINDOW
+    return hours * 60 + minutes
+
+
+def minutes_to_window(value: int) -> Optional[str]:
+    if value < 0:
+        return None
+    return f"{value // 60:02d}:{value % 60:02d}"
+
+
+def _uuid_parts(value: uuid.UUID) -> tuple:
+    number = value.int
+    return number >> 64, number & _LOW_MASK
+
+
+def _parts_uuid(parts) -> uuid.UUID:
+    return uuid.UUID(int=(int(parts[0]) << 64) | int(parts[1]))
+
+
+def _pack_strings(values: list) -> tuple:
+    """Concatenar strings UTF-8 em um buffer único com offsets"""
+    import numpy as np
+    encoded = [v.encode() for v in values]
+    lengths = np.fromiter((len(v) for v in encoded), dtype=np.int64, count=len(encoded))
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    offset_dtype = np.uint32 if offsets[-1] <= np.iinfo(np.uint32).max else np.int64
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return offsets.astype(offset_dtype), data
+
+
+class CredentialRecord:
+    """Visão leve de uma credencial retornada por CredentialIndex.lookup"""
+
+    __slots__ = (
+        "card_id", "credential_id", "user_id", "user_name", "user_email",
+        "user_active", "has_time_restriction", "window_start", "window_end"
+    )
+
+    def __init__(self, card_id, credential_id, user_id, user_name, user_email,
+                 user_active, has_time_restriction, window_start, window_end):
+        self.card_id = card_id
+        self.credential_id = credential_id
+        self.user_id = user_id
+        self.user_name = user_name
+        self.user_email = user_email
+        self.user_active = user_active
+        self.has_time_restriction = has_time_restriction
+        self.window_start = window_start
+        self.window_end = window_end
+
+    @property
+    def time_window_start(self) -> Optional[str]:
+        return minutes_to_window(self.window_start)
+
+    @property
+    def time_window_end(self) -> Optional[str]:
+        return minutes_to_window(self.window_end)
+
+
+class CredentialIndex:
+    """Índice compacto de credenciais ativas, com busca por card_id"""
+
+    ARRAY_NAMES = (
+        "card_ids", "credential_ids", "user_index", "window_start", "window_end", "flags",
+        "user_ids", "user_flags", "name_offsets", "name_data", "email_offsets", "email_data"
+    )
+
+    def __init__(self, arrays: Dict[str, "np.ndarray"], meta: Optional[dict] = None, buffer=None):
+        for name in self.ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.meta = meta or {}
+        # Mantém o mmap vivo enquanto os arrays apontarem para ele
+        self._buffer = buffer
+
+    def __len__(self):
+        return len(self.card_ids)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable, meta: Optional[dict] = None) -> "CredentialIndex":
+        """
+        Construir o índice a partir de linhas
+        (credential_id, card_id, has_time_restriction, time_window_start, time_window_end,
+         user_id, full_name, email, user_is_active)
+        """
+        import numpy as np
+        cards, credential_ids, user_index, starts, ends, flags = [], [], [], [], [], []
+        users: Dict[uuid.UUID, int] = {}
+        user_ids, user_flags, names, emails = [], [], [], []
+
+        for (credential_id, card_id, has_time_restriction, window_start, window_end,
+             user_id, full_name, email, user_active) in rows:
+            position = users.get(user_id)
+            if position is None:
+                position = len(user_ids)
+                users[user_id] = position
+                user_ids.append(_uuid_parts(user_id))
+                user_flags.append(FLAG_USER_ACTIVE if user_active else 0)
+                names.append(full_name)
+                emails.append(email)
+            cards.append(card_id.encode())
+            credential_ids.append(_uuid_parts(credential_id))
+            user_index.append(position)
+            starts.append(window_to_minutes(window_start))
+            ends.append(window_to_minutes(window_end))
+            flags.append(FLAG_TIME_RESTRICTED if has_time_restriction else 0)
+
+        width = max((len(card) for card in cards), default=1) or 1
+        card_array = np.array(cards, dtype=f"S{width}")
+        order = np.argsort(card_array, kind="stable")
+        name_offsets, name_data = _pack_strings(names)
+        email_offsets, email_data = _pack_strings(emails)
+
+        arrays = {
+            "card_ids": card_array[order],
+            "credential_ids": np.array(credential_ids, dtype=np.uint64).reshape(-1, 2)[order],
+            "user_index": np.array(user_index, dtype=np.int32)[order],
+            "window_start": np.array(starts, dtype=np.int16)[order],
+            "window_end": np.array(ends, dtype=np.int16)[order],
+            "flags": np.array(flags, dtype=np.uint8)[order],
+            "user_ids": np.array(user_ids, dtype=np.uint64).reshape(-1, 2),
+            "user_flags": np.array(user_flags, dtype=np.uint8),
+            "name_offsets": name_offsets,
+            "name_data": name_data,
+            "email_offsets": email_offsets,
+            "email_data": email_data
+        }
+        return cls(arrays, meta)
+
+    @property
+    def nbytes(self) -> int:
+        """Memória ocupada pelos arrays do índice"""
+        return sum(getattr(self, name).nbytes for name in self.ARRAY_NAMES)
+
+    def _string(self, offsets: "np.ndarray", data: "np.ndarray", position: int) -> str:
+        return data[int(offsets[position]):int(offsets[position + 1])].tobytes().decode()
+
+    def lookup(self, card_id: str) -> Optional[CredentialRecord]:
+        """Buscar uma credencial ativa pelo card_id (busca binária)"""
+        key = card_id.encode()
+        if len(self) == 0 or len(key) > self.card_ids.dtype.itemsize:
+            return None
+        position = int(self.card_ids.searchsorted(key))
+        if position >= len(self) or self.card_ids[position] != key:
+            return None
+
+        user = int(self.user_index[position])
+        return CredentialRecord(
+            card_id=card_id,
+            credential_id=_parts_uuid(self.credential_ids[position]),
+            user_id=_parts_uuid(self.user_ids[user]),
+            user_name=self._string(self.name_offsets, self.name_data, user),
+            user_email=self._string(self.email_offsets, self.email_data, user),
+            user_active=bool(self.user_flags[user] & FLAG_USER_ACTIVE),
+            has_time_restriction=bool(self.flags[position] & FLAG_TIME_RESTRICTED),
+            window_start=int(self.window_start[position]),
+            window_end=int(self.window_end[position])
+        )
+
+    # --------------------------
+    # Arquivo mapeado em memória
+    # --------------------------
+    def save(self, path: str):
+        """
+        Gravar o índice em um único arquivo: magic, tamanho do cabeçalho,
+        cabeçalho JSON e os arrays alinhados em 64 bytes
+        """
+        import numpy as np
+        specs = {}
+        offset = 0
+        for name in self.ARRAY_NAMES:
+            array = np.ascontiguousarray(getattr(self, name))
+            specs[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+        header = json.dumps({"arrays": specs, "meta": self.meta}).encode()
+        data_start = -(-(len(FILE_MAGIC) + 8 + len(header)) // _ALIGNMENT) * _ALIGNMENT
+
+        with open(path, "wb") as f:
+            f.write(FILE_MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            for name in self.ARRAY_NAMES:
+                f.seek(data_start + specs[name]["offset"])
+                f.write(np.ascontiguousarray(getattr(self, name)).tobytes())
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @classmethod
+    def open(cls, path: str) -> "CredentialIndex":
+        """Abrir um índice gravado por save() via mmap, sem copiar os arrays"""
+        import numpy as np
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(FILE_MAGIC)] != FILE_MAGIC:
+            buffer.close()
+            raise ValueError(f"Arquivo de índice inválido: {path}")
+
+        (header_size,) = struct.unpack_from("<Q", buffer, len(FILE_MAGIC))
+        header_start = len(FILE_MAGIC) + 8
+        header = json.loads(buffer[header_start:header_start + header_size])
+        data_start = -(-(header_start + header_size) // _ALIGNMENT) * _ALIGNMENT
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            arrays[name] = np.frombuffer(
+                buffer, dtype=dtype, count=count, offset=data_start + spec["offset"]
+            ).reshape(spec["shape"])
+        return cls(arrays, header["meta"], buffer)
+
+
+def credential_rows_query():
+    """
+    Consulta única de credenciais ativas com os dados do usuário. A janela já
+    vem resolvida: a do perfil de horário, quando atribuído, ou a própria.
+    """
+    return (
+        select(
+            RFIDCredential.id, RFIDCredential.card_id, RFIDCredential.has_time_restriction,
+            func.coalesce(TimeWindowProfile.time_window_start, RFIDCredential.time_window_start),
+            func.coalesce(TimeWindowProfile.time_window_end, RFIDCredential.time_window_end),
+            User.id, User.full_name, User.email, User.is_active
+        )
+        .join(User, RFIDCredential.user_id == User.id)
+        .outerjoin(TimeWindowProfile, RFIDCredential.time_profile_id == TimeWindowProfile.id)
+        .where(RFIDCredential.is_active == True)
+    )
+
+
+def load_credential_index(db: Session, meta: Optional[dict] = None) -> CredentialIndex:
+    """Carregar o índice do PostgreSQL em uma única consulta"""
+    rows = db.execute(credential_rows_query()).yield_per(50_000)
+    return CredentialIndex.from_rows(rows, meta)
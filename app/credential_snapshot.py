@@ -0,0 +1,223 @@
+"""
+Snapshot de credenciais compartilhado entre os workers do host
+
+Um único processo por host reconstrói o índice compacto de credenciais
+(app.credential_index) a partir do PostgreSQL e o grava em um arquivo
+versionado, publicado com rename atômico. Todos os workers mapeiam o
+arquivo em memória (leitura sem cópia) para as decisões de validate-access.
+
+Arquivos, todos derivados de CREDENTIAL_SNAPSHOT_PATH:
+  • <path>        snapshot atual (meta: version, built_at_ns)
+  • <path>.dirty  marcador tocado após cada alteração de credenciais/usuários
+  • <path>.lock   flock que coordena a reconstrução
+
+O snapshot é considerado desatualizado quando:
+  • o marcador é mais recente que o início da sua construção (alterações neste host);
+  • o contador "credentials" da tabela change_counters, incrementado na mesma
+    transação de cada alteração, passou da versão gravada no snapshot
+    (alterações feitas por outros hosts; lido no máximo a cada
+    CREDENTIAL_SNAPSHOT_VERSION_CHECK_SECONDS);
+  • excede CREDENTIAL_SNAPSHOT_MAX_AGE_SECONDS, se configurada (desligada por padrão).
+Nesses casos a decisão volta a usar o banco enquanto uma reconstrução roda
+em background: no máximo uma thread por processo, que aguarda o flock (e
+reaproveita o snapshot que outro worker publicar), e uma tentativa a cada
+CREDENTIAL_SNAPSHOT_REBUILD_INTERVAL_SECONDS, para que uma sequência de
+alterações não vire uma sequência de reconstruções completas.
+"""
+
+from typing import Callable, Optional
+import fcntl
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.credential_index import CredentialIndex, load_credential_index
+from app.models import ChangeCounter
+
+logger = logging.getLogger(__name__)
+
+CREDENTIALS_COUNTER = "credentials"
+
+
+def bump_credentials_version(db: Session):
+    """Incrementar a versão das credenciais no banco (chamar antes do commit da alteração)"""
+    stmt = insert(ChangeCounter).values(name=CREDENTIALS_COUNTER, version=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ChangeCounter.name],
+        set_={"version": ChangeCounter.version + 1}
+    ))
+
+
+def read_credentials_version(db: Session) -> int:
+    """Versão atual das credenciais no banco (0 antes da primeira alteração)"""
+    return db.execute(
+        select(ChangeCounter.version).where(ChangeCounter.name == CREDENTIALS_COUNTER)
+    ).scalar() or 0
+
+
+class CredentialSnapshot:
+    def __init__(
+        self,
+        path: str,
+        max_age_seconds: int,
+        enabled: bool = True,
+        version_check_seconds: float = 1,
+        rebuild_interval_seconds: float = 5
+    ):
+        self.enabled = enabled
+        self.path = path
+        self.dirty_path = f"{path}.dirty"
+        self.lock_path = f"{path}.lock"
+        self.max_age_ns = max_age_seconds * 1_000_000_000
+        self.version_check_seconds = version_check_seconds
+        self.rebuild_interval_seconds = rebuild_interval_seconds
+        # Última versão lida do banco e quando (time.monotonic)
+        self._db_version = 0
+        self._db_version_checked_at: Optional[float] = None
+        self._index: Optional[CredentialIndex] = None
+        self._file_key = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        # Fim da última tentativa de reconstrução deste processo (time.monotonic)
+        self._last_rebuild_at: Optional[float] = None
+
+    def _ensure_directory(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def invalidate(self):
+        """Marcar o snapshot como desatualizado (chamar após o commit da alteração)"""
+        if not self.enabled:
+            return
+        self._ensure_directory()
+        now = time.time_ns()
+        with open(self.dirty_path, "a"):
+            pass
+        os.utime(self.dirty_path, ns=(now, now))
+
+    def _dirty_since(self) -> int:
+        try:
+            return os.stat(self.dirty_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _mapped(self) -> Optional[CredentialIndex]:
+        """Índice do arquivo atual, remapeando quando o arquivo foi substituído"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if key != self._file_key:
+            with self._lock:
+                if key != self._file_key:
+                    self._index = CredentialIndex.open(self.path)
+                    self._file_key = key
+        return self._index
+
+    def _known_db_version(self, db: Optional[Session]) -> int:
+        """Versão das credenciais no banco, relida no máximo a cada version_check_seconds"""
+        now = time.monotonic()
+        checked_at = self._db_version_checked_at
+        if db is not None and (checked_at is None or now - checked_at >= self.version_check_seconds):
+            self._db_version_checked_at = now
+            self._db_version = max(self._db_version, read_credentials_version(db))
+        return self._db_version
+
+    def current(self, db: Optional[Session] = None) -> Optional[CredentialIndex]:
+        """
+        Índice compartilhado, ou None se desabilitado, ausente ou desatualizado.
+        Com `db`, também compara a versão das credenciais no banco.
+        """
+        if not self.enabled:
+            return None
+        index = self._mapped()
+        if index is None:
+            return None
+        built_at = index.meta["built_at_ns"]
+        if self._dirty_since() >= built_at:
+            return None
+        if self.max_age_ns and time.time_ns() - built_at > self.max_age_ns:
+            return None
+        if index.meta.get("db_version", -1) < self._known_db_version(db):
+            return None
+        return index
+
+    def rebuild(self, session_factory: Callable[[], Session], wait: bool = False) -> bool:
+        """
+        Reconstruir o snapshot. Apenas um processo por host reconstrói por vez:
+        sem `wait`, retorna False se outro processo já estiver reconstruindo;
+        com `wait`, aguarda e reaproveita o snapshot que ele publicar.
+        """
+        self._ensure_directory()
+        with open(self.lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                db = session_factory()
+                try:
+                    if self.current(db) is not None:
+                        return True
+
+                    previous = self._mapped()
+                    version = previous.meta["version"] + 1 if previous is not None else 1
+                    built_at = time.time_ns()
+                    # Versão lida antes das linhas: o índice é no mínimo tão novo quanto ela
+                    db_version = read_credentials_version(db)
+                    index = load_credential_index(
+                        db, {"version": version, "built_at_ns": built_at, "db_version": db_version}
+                    )
+                finally:
+                    db.close()
+
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                index.save(tmp_path)
+                os.replace(tmp_path, self.path)
+                logger.info("Snapshot de credenciais v%s publicado (%s credenciais)", version, len(index))
+                return True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def request_rebuild(self, session_factory: Callable[[], Session]):
+        """
+        Disparar a reconstrução em background, sem bloquear a requisição atual. Ignorado
+        se já houver uma em andamento neste processo ou se a última terminou há menos de
+        rebuild_interval_seconds.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            last = self._last_rebuild_at
+            if last is not None and time.monotonic() - last < self.rebuild_interval_seconds:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_background, args=(session_factory,), daemon=True).start()
+
+    def _rebuild_in_background(self, session_factory: Callable[[], Session]):
+        try:
+            # Aguarda o flock: se outro worker está reconstruindo, reaproveita o que ele publicar
+            self.rebuild(session_factory, wait=True)
+        except Exception:
+            logger.exception("Falha ao reconstruir o snapshot de credenciais")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+                self._last_rebuild_at = time.monotonic()
+
+
+credential_snapshot = CredentialSnapshot(
+    settings.CREDENTIAL_SNAPSHOT_PATH,
+    settings.CREDENTIAL_SNAPSHOT_MAX_AGE_SECONDS,
+    settings.CREDENTIAL_SNAPSHOT_ENABLED,
+    settings.CREDENTIAL_SNAPSHOT_VERSION_CHECK_SECONDS,
+    settings.CREDENTIAL_SNAPSHOT_REBUILD_INTERVAL_SECONDS
+)
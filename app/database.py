@@ -1,18 +1,91 @@
-from sqlalchemy import create_engine
+from typing import Optional
+from sqlalchemy import create_engine, make_url, text
 from sqlalchemy.orm import declarative_base, sessionmaker
 from app.config import settings
+from app.profiling import sql_profiler
+import threading
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,      # Verifica conexões antes de usar
-    pool_size=10,            # Aumenta pool para múltiplas requisições
-    max_overflow=20,         # Permite picos de acesso
-    pool_recycle=3600        # Recicla conexões antigas
-)
+# Engines criados sob demanda (lifespan da aplicação ou primeiro uso),
+# para que importar os módulos não abra o driver do banco.
+# `engine` é o engine padrão (scripts e tarefas em background); cada classe
+# de carga (settings.WORKLOADS) tem o seu próprio engine e pool.
+engine = None
+workload_engines = {}
+_workload_sessions = {}
+_engine_lock = threading.Lock()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class _LazySessionmaker(sessionmaker):
+    """sessionmaker que garante a criação do engine antes da primeira sessão"""
+
+    def __call__(self, **local_kw):
+        get_engine()
+        return super().__call__(**local_kw)
+
+SessionLocal = _LazySessionmaker(autocommit=False, autoflush=False)
 Base = declarative_base()
 
+def _create_engine(workload: Optional[str] = None):
+    options = {
+        "pool_pre_ping": True,        # Verifica conexões antes de usar
+        "pool_recycle": 3600          # Recicla conexões antigas
+    }
+    if workload is None:
+        options["pool_size"] = settings.DB_POOL_SIZE
+        options["max_overflow"] = settings.DB_MAX_OVERFLOW
+    else:
+        config = settings.WORKLOADS[workload]
+        options["pool_size"] = config["pool_size"]
+        # Requisições admitidas pela classe nunca esperam por conexão
+        options["max_overflow"] = max(config["max_overflow"], config["concurrency"] - config["pool_size"])
+        if make_url(settings.DATABASE_URL).get_backend_name() == "postgresql":
+            options["connect_args"] = {"options": f"-c statement_timeout={config['statement_timeout_ms']}"}
+    new_engine = create_engine(settings.DATABASE_URL, **options)
+    sql_profiler.instrument(new_engine)
+    return new_engine
+
+def get_engine(workload: Optional[str] = None):
+    """Obter o engine do banco (padrão ou de uma classe de carga), criando-o na primeira chamada"""
+    global engine
+    if workload is None:
+        if engine is None:
+            with _engine_lock:
+                if engine is None:
+                    engine = _create_engine()
+                    SessionLocal.configure(bind=engine)
+        return engine
+
+    if workload not in workload_engines:
+        with _engine_lock:
+            if workload not in workload_engines:
+                workload_engine = _create_engine(workload)
+                _workload_sessions[workload] = sessionmaker(autocommit=False, autoflush=False, bind=workload_engine)
+                workload_engines[workload] = workload_engine
+    return workload_engines[workload]
+
+def dispose_engines():
+    """Fechar as conexões de todos os pools"""
+    for current_engine in [engine, *workload_engines.values()]:
+        if current_engine is not None:
+            current_engine.dispose()
+
+def workload_session(workload: str):
+    """Nova sessão no pool da classe de carga informada"""
+    get_engine(workload)
+    return _workload_sessions[workload]()
+
+def warm_up_pool(connections: int, workload: Optional[str] = None):
+    """Abrir conexões do pool antecipadamente, antes de aceitar tráfego"""
+    current_engine = get_engine(workload)
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = current_engine.connect()
+            conn.execute(text("SELECT 1"))
+            opened.append(conn)
+    finally:
+        for conn in opened:
+            conn.close()
+
 def get_db():
     """Dependency para obter sessão do banco de dados"""
     db = SessionLocal()
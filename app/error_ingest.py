@@ -0,0 +1,120 @@
+"""
+Ingestão de logs de erro em lote com agrupamento (deduplicação)
+
+Dispositivos em falha reportam o mesmo erro milhares de vezes por minuto.
+Em vez de gravar uma linha por ocorrência, os erros recebidos são agrupados
+em memória por (error_type, component, severity) e mesclados com as linhas
+já abertas dentro da janela de agrupamento, usando poucas instruções SQL.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+import uuid
+
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.models import ErrorLog, ErrorSeverity
+from app.schemas import ErrorLogCreate
+
+ErrorKey = Tuple[str, str, ErrorSeverity]
+
+
+@dataclass
+class CoalescedError:
+    error_type: str
+    component: str
+    severity: ErrorSeverity
+    description: str
+    count: int
+    first_seen: datetime
+    last_seen: datetime
+
+
+def coalesce_errors(errors: List[ErrorLogCreate], now: datetime) -> Dict[ErrorKey, CoalescedError]:
+    """Agrupar erros repetidos, mantendo contagem e a descrição mais recente"""
+    groups: Dict[ErrorKey, CoalescedError] = {}
+    for error in errors:
+        key = (error.error_type, error.component, error.severity)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = CoalescedError(
+                error_type=error.error_type,
+                component=error.component,
+                severity=error.severity,
+                description=error.description,
+                count=1,
+                first_seen=now,
+                last_seen=now
+            )
+        else:
+            group.count += 1
+            group.description = error.description
+    return groups
+
+
+def ingest_error_batch(db: Session, errors: List[ErrorLogCreate], window_seconds: int) -> dict:
+    """
+    Gravar um lote de erros agrupados.
+
+    Grupos que já possuem uma linha com last_seen dentro da janela são
+    incrementados (um UPDATE em lote); os demais viram novas linhas
+    (um INSERT em lote). Não há refresh por linha.
+    """
+    now = datetime.now(timezone.utc)
+    groups = coalesce_errors(errors, now)
+    if not groups:
+        return {"received": 0, "coalesced": 0, "inserted": 0, "updated": 0}
+
+    # Linhas abertas dentro da janela, travadas para evitar contagem perdida entre workers
+    window_start = now - timedelta(seconds=window_seconds)
+    open_rows = db.execute(
+        select(ErrorLog.id, ErrorLog.error_type, ErrorLog.component, ErrorLog.severity, ErrorLog.occurrences)
+        .where(
+            tuple_(ErrorLog.error_type, ErrorLog.component, ErrorLog.severity).in_(list(groups.keys())),
+            ErrorLog.last_seen >= window_start
+        )
+        .order_by(ErrorLog.last_seen.desc())
+        .with_for_update()
+    ).all()
+
+    updates = []
+    for row in open_rows:
+        group = groups.pop((row.error_type, row.component, row.severity), None)
+        if group is None:
+            # Mais de uma linha aberta para o mesmo grupo: usa apenas a mais recente
+            continue
+        updates.append({
+            "id": row.id,
+            "occurrences": row.occurrences + group.count,
+            "description": group.description,
+            "last_seen": group.last_seen
+        })
+
+    inserts = [
+        {
+            "id": uuid.uuid4(),
+            "error_type": group.error_type,
+            "component": group.component,
+            "description": group.description,
+            "severity": group.severity,
+            "occurrences": group.count,
+            "first_seen": group.first_seen,
+            "last_seen": group.last_seen
+        }
+        for group in groups.values()
+    ]
+
+    if updates:
+        db.execute(update(ErrorLog), updates)
+    if inserts:
+        db.execute(insert(ErrorLog), inserts)
+    db.commit()
+
+    return {
+        "received": len(errors),
+        "coalesced": len(updates) + len(inserts),
+        "inserted": len(inserts),
+        "updated": len(updates)
+    }
@@ -1,14 +1,49 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
 from app.config import settings
-from app.routers import users, rfid, logs
-from app.database import SessionLocal
+from app.routers import users, rfid, logs, debug
+from app.archive import start_archiver
+from app.credential_snapshot import credential_snapshot
+from app.database import SessionLocal, dispose_engines, get_engine, warm_up_pool
 from app.models import HttpLog
+from app.profiling import SQLProfilingMiddleware, sql_profiler
+from app.workload import configure_threads, gates
+
+
+def warm_up():
+    """Preparar engine, pool de conexões e caches antes de aceitar tráfego"""
+    get_engine()
+    for workload in settings.WORKLOADS:
+        get_engine(workload)
+    warm_up_pool(settings.STARTUP_POOL_WARMUP, "access")
+    rfid.brazil_timezone()
+    # Reconstrução em background; o /ready só libera o tráfego depois que o snapshot é publicado
+    credential_snapshot.request_rebuild(SessionLocal)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.snapshot_ready = not credential_snapshot.enabled
+    configure_threads()
+    await run_in_threadpool(warm_up)
+    start_archiver(SessionLocal)
+    sql_profiler.start(SessionLocal)
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    dispose_engines()
+
 
 app = FastAPI(
     title="SafeWay API",
     description="API para sistema de controle de acesso inteligente",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -20,10 +55,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiling de SQL por rota (opt-in via SQL_PROFILING)
+if sql_profiler.enabled:
+    app.add_middleware(SQLProfilingMiddleware)
+
 # Incluir routers
 app.include_router(users.router, prefix="/api/v1/users", tags=["users"])
 app.include_router(rfid.router, prefix="/api/v1/rfid", tags=["rfid"])
 app.include_router(logs.router, prefix="/api/v1/logs", tags=["logs"])
+if sql_profiler.enabled:
+    app.include_router(debug.router, prefix="/api/v1/debug", tags=["debug"])
 
 
 @app.get("/")
@@ -33,3 +74,42 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+def _database_reachable() -> bool:
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+
+def _snapshot_status() -> dict:
+    index = credential_snapshot.current()
+    if index is None:
+        return {"enabled": credential_snapshot.enabled, "available": False}
+    return {"enabled": True, "available": True, "version": index.meta["version"], "credentials": len(index)}
+
+@app.get("/ready")
+async def readiness_check(request: Request):
+    """
+    Readiness: aquecimento concluído, snapshot de credenciais publicado e banco acessível
+    (o /health indica apenas que o processo está vivo)
+    """
+    state = request.app.state
+    if not getattr(state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    snapshot = await run_in_threadpool(_snapshot_status)
+    if not state.snapshot_ready:
+        if not snapshot["available"]:
+            # Sem o snapshot as portas consultariam o banco: aguarda (e refaz, se a reconstrução falhou)
+            credential_snapshot.request_rebuild(SessionLocal)
+            return JSONResponse(status_code=503, content={"status": "starting", "credential_snapshot": snapshot})
+        # Depois da primeira publicação, um snapshot desatualizado não tira o worker do balanceador
+        state.snapshot_ready = True
+    if not await run_in_threadpool(_database_reachable):
+        return JSONResponse(status_code=503, content={"status": "database_unavailable"})
+    return {
+        "status": "ready",
+        "credential_snapshot": snapshot,
+        "workloads": {name: gate.stats() for name, gate in gates.items()}
+    }
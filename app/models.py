@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Enum, Integer
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Enum, Integer, BigInteger, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -26,10 +26,25 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Versão da linha, incrementada a cada UPDATE (usada nos ETags)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relacionamento com credenciais RFID
     rfid_credentials = relationship("RFIDCredential", back_populates="user")
 
+class TimeWindowProfile(Base):
+    __tablename__ = "time_window_profiles"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name = Column(String(255), unique=True, nullable=False)
+    time_window_start = Column(String(5), nullable=False)  # Formato "HH:MM"
+    time_window_end = Column(String(5), nullable=False)    # Formato "HH:MM"
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # Credenciais que usam este perfil
+    rfid_credentials = relationship("RFIDCredential", back_populates="time_profile")
+
 class RFIDCredential(Base):
     __tablename__ = "rfid_credentials"
     
@@ -42,14 +57,26 @@ class RFIDCredential(Base):
     has_time_restriction = Column(Boolean, default=False)
     time_window_start = Column(String(5), nullable=True)  # Formato "HH:MM"
     time_window_end = Column(String(5), nullable=True)    # Formato "HH:MM"
+    # Perfil de horário compartilhado; quando definido, substitui a janela própria
+    time_profile_id = Column(UUID(as_uuid=True), ForeignKey("time_window_profiles.id"), nullable=True, index=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Versão da linha, incrementada a cada UPDATE (usada nos ETags)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relacionamentos
     user = relationship("User", back_populates="rfid_credentials")
+    time_profile = relationship("TimeWindowProfile", back_populates="rfid_credentials")
     access_logs = relationship("AccessLog", back_populates="rfid_credential")
 
+def _bump_version(mapper, connection, target):
+    """Incrementar a versão no próprio UPDATE (version = version + 1), monotônico entre transações"""
+    target.version = mapper.class_.version + 1
+
+for _versioned in (User, RFIDCredential):
+    event.listen(_versioned, "before_update", _bump_version)
+
 class AccessLog(Base):
     __tablename__ = "access_logs"
     
@@ -75,6 +102,11 @@ class ErrorLog(Base):
     description = Column(Text, nullable=False)
     severity = Column(Enum(ErrorSeverity), nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Agrupamento de erros repetidos (ingestão em lote)
+    occurrences = Column(Integer, nullable=False, default=1, server_default="1")
+    first_seen = Column(DateTime(timezone=True), server_default=func.now())
+    last_seen = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
 class HttpLog(Base):
     __tablename__ = "http_logs"
@@ -86,3 +118,9 @@ class HttpLog(Base):
     payload = Column(Text, nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
 
+class ChangeCounter(Base):
+    __tablename__ = "change_counters"
+    
+    # Contador incrementado na mesma transação de cada alteração (ex.: "credentials")
+    name = Column(String(64), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
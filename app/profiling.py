@@ -0,0 +1,334 @@
+"""
+Profiling de SQL por rota e log de consultas lentas (opt-in)
+
+SQL_PROFILING controla o modo:
+  • off     nenhum listener é registrado nos engines (padrão)
+  • sample  apenas uma fração das requisições (SQL_PROFILING_SAMPLE_RATE) é medida;
+            nas demais o custo é uma leitura de ContextVar por instrução
+  • on      todas as requisições e também as instruções fora de requisição
+            (tarefas em background), agrupadas na rota "background"
+
+Os eventos before/after_cursor_execute do SQLAlchemy medem cada instrução e a
+atribuem à rota da requisição atual (método + template do path). Instruções
+são agrupadas por fingerprint: o SQL normalizado, sem literais, parâmetros e
+listas IN/VALUES de tamanho variável.
+
+Instruções acima de SQL_SLOW_QUERY_MS entram em uma fila e são gravadas em
+lote em error_logs (error_type "slow_query") via ingest_error_batch, uma linha
+por rota + fingerprint dentro da janela de agrupamento. A cada
+SQL_PROFILING_AGGREGATION_SECONDS o período atual é fechado e as instruções
+com maior tempo total vão para o log e para o endpoint /api/v1/debug/sql.
+"""
+
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+
+from sqlalchemy import event
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_ROUTE = "background"
+UNROUTED = "-"
+SLOW_QUERY_ERROR_TYPE = "slow_query"
+SLOW_QUERY_QUEUE_LIMIT = 10_000
+
+# Requisição medida no contexto atual (None = não amostrada ou fora de requisição)
+_current_request: ContextVar[Optional[dict]] = ContextVar("sql_profiling_request", default=None)
+# Verdadeiro na thread que grava o log de consultas lentas, para não medir a si mesma
+_suppressed: ContextVar[bool] = ContextVar("sql_profiling_suppressed", default=False)
+
+
+# --------------------------
+# Fingerprint
+# --------------------------
+_NORMALIZE_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),                                # literais de texto
+    (re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+"), "?"),                 # parâmetros (pyformat, numeric, named)
+    (re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b"), "?"),                  # literais numéricos
+    (re.compile(r"\s+"), " "),
+    (re.compile(r"\bIN \((?:\?, )*\?\)", re.IGNORECASE), "IN (...)"),     # listas IN expandidas
+    (re.compile(r"\bVALUES (\(.*?\))(?:, \(.*?\))+", re.IGNORECASE), r"VALUES \1, ..."),  # inserts em lote
+]
+
+
+@lru_cache(maxsize=4096)
+def normalize_statement(statement: str) -> str:
+    """SQL sem literais nem parâmetros, com espaços e listas de tamanho variável colapsados"""
+    normalized = statement
+    for pattern, replacement in _NORMALIZE_PATTERNS:
+        normalized = pattern.sub(replacement, normalized)
+    return normalized.strip()
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """Identificador curto e estável do SQL normalizado"""
+    return hashlib.sha1(normalize_statement(statement).encode()).hexdigest()[:12]
+
+
+# --------------------------
+# Estatísticas
+# --------------------------
+class SQLProfileStats:
+    """Contadores por rota e por fingerprint, com fechamento periódico do top de instruções"""
+
+    def __init__(self, top_n: int):
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self.started_at = datetime.now(timezone.utc)
+        self.routes: Dict[str, dict] = {}
+        self._period: Dict[str, dict] = {}
+        self._period_started_at = self.started_at
+        self.last_period: Optional[dict] = None
+
+    def record(self, route: str, statement: str, elapsed: float):
+        key = fingerprint(statement)
+        with self._lock:
+            route_stats = self.routes.get(route)
+            if route_stats is None:
+                route_stats = self.routes[route] = {"count": 0, "total": 0.0, "max": 0.0, "statements": {}}
+            route_stats["count"] += 1
+            route_stats["total"] += elapsed
+            route_stats["max"] = max(route_stats["max"], elapsed)
+            statement_stats = route_stats["statements"].get(key)
+            if statement_stats is None:
+                statement_stats = route_stats["statements"][key] = [0, 0.0, statement]
+            statement_stats[0] += 1
+            statement_stats[1] += elapsed
+
+            period_stats = self._period.get(key)
+            if period_stats is None:
+                period_stats = self._period[key] = {
+                    "statement": statement, "count": 0, "total": 0.0, "max": 0.0, "routes": set()
+                }
+            period_stats["count"] += 1
+            period_stats["total"] += elapsed
+            period_stats["max"] = max(period_stats["max"], elapsed)
+            period_stats["routes"].add(route)
+
+    def _top(self, period: Dict[str, dict]) -> List[dict]:
+        ranked = sorted(period.items(), key=lambda item: item[1]["total"], reverse=True)[:self.top_n]
+        return [
+            {
+                "fingerprint": key,
+                "statement": normalize_statement(stats["statement"]),
+                "count": stats["count"],
+                "total_ms": round(stats["total"] * 1000, 3),
+                "avg_ms": round(stats["total"] * 1000 / stats["count"], 3),
+                "max_ms": round(stats["max"] * 1000, 3),
+                "routes": sorted(stats["routes"])
+            }
+            for key, stats in ranked
+        ]
+
+    def rollover(self) -> dict:
+        """Fechar o período atual e guardar o seu top de instruções por tempo total"""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            period, self._period = self._period, {}
+            started_at, self._period_started_at = self._period_started_at, now
+        self.last_period = {"start": started_at, "end": now, "top_statements": self._top(period)}
+        return self.last_period
+
+    def snapshot(self) -> dict:
+        """Contagem e tempo de SQL por rota, mais o top do período atual e do último fechado"""
+        with self._lock:
+            routes = [
+                {
+                    "route": route,
+                    "count": stats["count"],
+                    "total_ms": round(stats["total"] * 1000, 3),
+                    "avg_ms": round(stats["total"] * 1000 / stats["count"], 3),
+                    "max_ms": round(stats["max"] * 1000, 3),
+                    "statements": [
+                        {
+                            "fingerprint": key,
+                            "statement": normalize_statement(statement),
+                            "count": count,
+                            "total_ms": round(total * 1000, 3)
+                        }
+                        for key, (count, total, statement) in sorted(
+                            stats["statements"].items(), key=lambda item: item[1][1], reverse=True
+                        )[:self.top_n]
+                    ]
+                }
+                for route, stats in self.routes.items()
+            ]
+            current = {
+                "start": self._period_started_at,
+                "top_statements": self._top(self._period)
+            }
+        routes.sort(key=lambda item: item["total_ms"], reverse=True)
+        return {
+            "since": self.started_at,
+            "routes": routes,
+            "current_period": current,
+            "last_period": self.last_period
+        }
+
+    def reset(self):
+        with self._lock:
+            self.started_at = self._period_started_at = datetime.now(timezone.utc)
+            self.routes = {}
+            self._period = {}
+            self.last_period = None
+
+
+class SQLProfiler:
+    def __init__(self, mode: str, sample_rate: float, slow_query_ms: float, top_n: int):
+        if mode not in ("off", "sample", "on"):
+            raise ValueError(f"SQL_PROFILING inválido: {mode}")
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.stats = SQLProfileStats(top_n)
+        self._slow_queries = deque(maxlen=SLOW_QUERY_QUEUE_LIMIT)
+        self._worker_started = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def should_sample(self) -> bool:
+        return self.mode == "on" or (self.mode == "sample" and random.random() < self.sample_rate)
+
+    # --------------------------
+    # Listeners do SQLAlchemy
+    # --------------------------
+    def instrument(self, engine):
+        """Registrar os listeners de tempo de execução em um engine"""
+        if not self.enabled:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _route(self) -> Optional[str]:
+        scope = _current_request.get()
+        if scope is None:
+            if self.mode != "on" or _suppressed.get():
+                return None
+            return BACKGROUND_ROUTE
+        route = scope.get("route")
+        return f"{scope['method']} {route.path}" if route is not None else UNROUTED
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if _current_request.get() is None and (self.mode != "on" or _suppressed.get()):
+            return
+        context._sql_profiling_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_sql_profiling_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        route = self._route()
+        if route is None:
+            return
+        self.stats.record(route, statement, elapsed)
+        if elapsed >= self.slow_query_seconds:
+            self._slow_queries.append((route, statement, elapsed))
+
+    # --------------------------
+    # Log de consultas lentas
+    # --------------------------
+    def flush_slow_queries(self, session_factory) -> int:
+        """Gravar em lote as consultas lentas acumuladas em error_logs"""
+        from app.error_ingest import ingest_error_batch
+        from app.models import ErrorSeverity
+        from app.schemas import ErrorLogCreate
+
+        entries = []
+        while self._slow_queries:
+            entries.append(self._slow_queries.popleft())
+        if not entries:
+            return 0
+
+        errors = [
+            ErrorLogCreate(
+                error_type=SLOW_QUERY_ERROR_TYPE,
+                component=f"{route} #{fingerprint(statement)}"[:255],
+                description=f"{elapsed * 1000:.1f} ms: {normalize_statement(statement)}",
+                severity=ErrorSeverity.MEDIUM
+            )
+            for route, statement, elapsed in entries
+        ]
+        token = _suppressed.set(True)
+        db = session_factory()
+        try:
+            ingest_error_batch(db, errors, settings.ERROR_LOG_COALESCE_WINDOW_SECONDS)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+            _suppressed.reset(token)
+        return len(entries)
+
+    def _run(self, session_factory, flush_seconds: int, aggregation_seconds: int):
+        _suppressed.set(True)
+        next_rollover = time.monotonic() + aggregation_seconds
+        while True:
+            time.sleep(flush_seconds)
+            try:
+                self.flush_slow_queries(session_factory)
+            except Exception:
+                logger.exception("Falha ao gravar o log de consultas lentas")
+            if time.monotonic() >= next_rollover:
+                next_rollover += aggregation_seconds
+                for item in self.stats.rollover()["top_statements"]:
+                    logger.info(
+                        "SQL top: %s execuções, %.1f ms total, %.1f ms máx [%s] %s",
+                        item["count"], item["total_ms"], item["max_ms"], item["fingerprint"], item["statement"]
+                    )
+
+    def start(self, session_factory):
+        """Iniciar a gravação periódica das consultas lentas e a agregação do top de instruções"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._worker_started:
+                return
+            self._worker_started = True
+        threading.Thread(
+            target=self._run,
+            args=(session_factory, settings.SQL_PROFILING_FLUSH_SECONDS, settings.SQL_PROFILING_AGGREGATION_SECONDS),
+            daemon=True
+        ).start()
+
+
+class SQLProfilingMiddleware:
+    """Middleware ASGI que decide a amostragem da requisição e expõe a rota aos listeners"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not sql_profiler.should_sample():
+            await self.app(scope, receive, send)
+            return
+        # O roteador preenche scope["route"] antes do endpoint executar
+        token = _current_request.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_request.reset(token)
+
+
+sql_profiler = SQLProfiler(
+    settings.SQL_PROFILING,
+    settings.SQL_PROFILING_SAMPLE_RATE,
+    settings.SQL_SLOW_QUERY_MS,
+    settings.SQL_PROFILING_TOP_N
+)
@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from app.profiling import sql_profiler
+
+router = APIRouter()
+
+# --------------------------
+# Profiling de SQL
+# --------------------------
+@router.get("/sql")
+async def sql_profile():
+    """Contagem e tempo de SQL por rota e top de instruções por tempo total (requer SQL_PROFILING)"""
+    return {
+        "mode": sql_profiler.mode,
+        "sample_rate": sql_profiler.sample_rate,
+        "slow_query_ms": sql_profiler.slow_query_seconds * 1000,
+        **sql_profiler.stats.snapshot()
+    }
+
+@router.delete("/sql")
+async def reset_sql_profile():
+    """Zerar os contadores de profiling"""
+    sql_profiler.stats.reset()
+    return {"message": "Contadores de profiling zerados"}
@@ -1,17 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
-from app.database import get_db
-from app.models import AccessLog, ErrorLog, HttpLog
+import uuid
+from app.analytics import access_analytics, ensure_fresh
+from app.archive import merge_with_archive, needs_archive
+from app.config import settings
+from app.error_ingest import ingest_error_batch
+from app.models import AccessLog, ErrorLog, EventType, HttpLog
 from app.schemas import (
     AccessLog as AccessLogSchema,
+    AccessEvent,
+    AccessGroupCount,
     ErrorLog as ErrorLogSchema,
     ErrorLogCreate,
+    ErrorLogBatchResult,
     HttpLog as HttpLogSchema
 )
+from app.workload import WorkloadRoute, render_json_list, get_sync_db, get_admin_db, get_reporting_db
 
-router = APIRouter()
+router = APIRouter(route_class=WorkloadRoute)
+
+access_logs_adapter = TypeAdapter(List[AccessLogSchema])
+error_logs_adapter = TypeAdapter(List[ErrorLogSchema])
 
 # --------------------------
 # Logs de Acesso
@@ -22,30 +34,77 @@ def list_access_logs(
     limit: int = 100, 
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_reporting_db)
 ):
     query = db.query(AccessLog)
     if start_date:
         query = query.filter(AccessLog.timestamp >= start_date)
     if end_date:
         query = query.filter(AccessLog.timestamp <= end_date)
-    return query.order_by(AccessLog.timestamp.desc()).offset(skip).limit(limit).all()
+    query = query.order_by(AccessLog.timestamp.desc())
+    if needs_archive(start_date):
+        # Intervalo anterior à janela quente: combina banco e arquivo antes de paginar,
+        # lendo apenas as partições mais recentes necessárias para skip + limit linhas
+        merged = merge_with_archive(query.limit(skip + limit).all(), start_date, end_date, skip + limit)
+        return merged[skip:skip + limit]
+    return query.offset(skip).limit(limit).all()
 
 @router.get("/access/all", response_model=List[AccessLogSchema])
 def list_all_access_logs(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_reporting_db)
 ):
     query = db.query(AccessLog)
     if start_date:
         query = query.filter(AccessLog.timestamp >= start_date)
     if end_date:
         query = query.filter(AccessLog.timestamp <= end_date)
-    return query.order_by(AccessLog.timestamp.desc()).all()
+    rows = query.order_by(AccessLog.timestamp.desc()).all()
+    if needs_archive(start_date):
+        rows = merge_with_archive(rows, start_date, end_date)
+    return Response(content=render_json_list(access_logs_adapter, rows), media_type="application/json")
+
+@router.get("/access/query", response_model=List[AccessEvent])
+def query_access_events(
+    limit: int = Query(100, ge=1, le=settings.ACCESS_ANALYTICS_MAX_LIMIT),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    location: Optional[str] = None,
+    event_type: Optional[EventType] = None,
+    card_id: Optional[str] = None,
+    user_id: Optional[uuid.UUID] = None,
+    db: Session = Depends(get_reporting_db)
+):
+    """Filtrar eventos de acesso recentes na janela analítica em memória"""
+    ensure_fresh(db)
+    return access_analytics.query(
+        limit=limit, start_date=start_date, end_date=end_date, location=location,
+        event_type=event_type, card_id=card_id, user_id=user_id
+    )
+
+@router.get("/access/query/top", response_model=List[AccessGroupCount])
+def top_access_events(
+    group_by: Literal["location", "event_type", "card_id", "user_id", "rfid_credential_id"],
+    limit: int = Query(10, ge=1, le=settings.ACCESS_ANALYTICS_MAX_LIMIT),
+    min_count: int = 1,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    location: Optional[str] = None,
+    event_type: Optional[EventType] = None,
+    card_id: Optional[str] = None,
+    user_id: Optional[uuid.UUID] = None,
+    db: Session = Depends(get_reporting_db)
+):
+    """Agrupar eventos de acesso recentes e retornar os N grupos mais frequentes (ex.: cartões negados mais de N vezes hoje)"""
+    ensure_fresh(db)
+    return access_analytics.top(
+        group_by, limit=limit, min_count=min_count, start_date=start_date, end_date=end_date,
+        location=location, event_type=event_type, card_id=card_id, user_id=user_id
+    )
 
 @router.get("/access/{log_id}", response_model=AccessLogSchema)
-def get_access_log(log_id: str, db: Session = Depends(get_db)):
+def get_access_log(log_id: str, db: Session = Depends(get_admin_db)):
     log = db.query(AccessLog).filter(AccessLog.id == log_id).first()
     if not log:
         raise HTTPException(status_code=404, detail="Log não encontrado")
@@ -55,13 +114,18 @@ def get_access_log(log_id: str, db: Session = Depends(get_db)):
 # Logs de Erros
 # --------------------------
 @router.post("/errors", response_model=ErrorLogSchema)
-def create_error_log(error_log: ErrorLogCreate, db: Session = Depends(get_db)):
+def create_error_log(error_log: ErrorLogCreate, db: Session = Depends(get_sync_db)):
     db_error_log = ErrorLog(**error_log.dict())
     db.add(db_error_log)
     db.commit()
     db.refresh(db_error_log)
     return db_error_log
 
+@router.post("/errors/batch", response_model=ErrorLogBatchResult)
+def create_error_logs_batch(error_logs: List[ErrorLogCreate], db: Session = Depends(get_sync_db)):
+    """Registrar erros em lote, agrupando ocorrências repetidas dentro da janela configurada"""
+    return ingest_error_batch(db, error_logs, settings.ERROR_LOG_COALESCE_WINDOW_SECONDS)
+
 @router.get("/errors", response_model=List[ErrorLogSchema])
 def list_error_logs(
     skip: int = 0, 
@@ -70,7 +134,7 @@ def list_error_logs(
     component: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_reporting_db)
 ):
     query = db.query(ErrorLog)
     if severity:
@@ -89,7 +153,7 @@ def list_all_error_logs(
     component: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_reporting_db)
 ):
     query = db.query(ErrorLog)
     if severity:
@@ -100,10 +164,11 @@ def list_all_error_logs(
         query = query.filter(ErrorLog.timestamp >= start_date)
     if end_date:
         query = query.filter(ErrorLog.timestamp <= end_date)
-    return query.order_by(ErrorLog.timestamp.desc()).all()
+    rows = query.order_by(ErrorLog.timestamp.desc()).all()
+    return Response(content=render_json_list(error_logs_adapter, rows), media_type="application/json")
 
 @router.get("/errors/{log_id}", response_model=ErrorLogSchema)
-def get_error_log(log_id: str, db: Session = Depends(get_db)):
+def get_error_log(log_id: str, db: Session = Depends(get_admin_db)):
     log = db.query(ErrorLog).filter(ErrorLog.id == log_id).first()
     if not log:
         raise HTTPException(status_code=404, detail="Log não encontrado")
@@ -113,7 +178,7 @@ def get_error_log(log_id: str, db: Session = Depends(get_db)):
 # Logs HTTP
 # --------------------------
 @router.get("/http", response_model=List[HttpLogSchema])
-def list_http_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def list_http_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_reporting_db)):
     """Listar logs de requisições HTTP (middleware)"""
     logs = db.query(HttpLog).order_by(HttpLog.timestamp.desc()).offset(skip).limit(limit).all()
     return logs
@@ -1,22 +1,130 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
+from sqlalchemy import and_, case, func, update
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
-from app.models import RFIDCredential, User, AccessLog, EventType
+from typing import List, Optional
+from app.analytics import access_analytics
+from app.cache import cached_response, make_etag, response_cache
+from app.credential_index import NO_WINDOW, CredentialRecord, window_to_minutes
+from app.credential_snapshot import bump_credentials_version, credential_snapshot
+from app.database import SessionLocal
+from app.models import RFIDCredential, TimeWindowProfile, User, AccessLog, EventType
 from app.schemas import RFIDCredentialCreate, RFIDCredentialUpdate, RFIDCredential as RFIDCredentialSchema, RFIDAccessRequest, AccessLog as AccessLogSchema
+from app.schemas import (
+    TimeWindowProfileCreate,
+    TimeWindowProfileUpdate,
+    TimeWindowProfile as TimeWindowProfileSchema,
+    CredentialProfileAssignment,
+    CredentialProfileAssignmentResult
+)
+from app.workload import WorkloadRoute, render_json_list, get_access_db, get_sync_db, get_admin_db, get_reporting_db
 import uuid
 from datetime import datetime
-import pytz
+from functools import lru_cache
 
-router = APIRouter()
+router = APIRouter(route_class=WorkloadRoute)
 
+credentials_adapter = TypeAdapter(List[RFIDCredentialSchema])
+
+@lru_cache(maxsize=1)
+def brazil_timezone():
+    """Fuso de São Paulo - pytz é importado apenas no primeiro uso"""
+    import pytz
+    return pytz.timezone('America/Sao_Paulo')
+
+def ensure_time_profile_exists(profile_id: Optional[uuid.UUID], db: Session):
+    """404 quando o perfil de horário informado não existe"""
+    if profile_id is not None and not db.query(TimeWindowProfile.id).filter(TimeWindowProfile.id == profile_id).first():
+        raise HTTPException(status_code=404, detail="Perfil de horário não encontrado")
+
+def apply_time_profile_rule(credential: RFIDCredential, fields_set: set):
+    """
+    Mesma regra da atribuição em lote: com perfil a restrição de horário fica ativa;
+    ao remover o perfil, ela vale apenas se a credencial tiver janela própria.
+    Um has_time_restriction explícito é respeitado, mas não pode desligar a de um perfil.
+    """
+    if "time_profile_id" in fields_set and "has_time_restriction" not in fields_set:
+        credential.has_time_restriction = credential.time_profile_id is not None or (
+            credential.time_window_start is not None and credential.time_window_end is not None
+        )
+    if credential.time_profile_id is not None and not credential.has_time_restriction:
+        raise HTTPException(status_code=400, detail="Credencial com perfil de horário exige has_time_restriction")
+
+# --------------------------
+# Perfis de horário
+# --------------------------
+@router.post("/profiles", response_model=TimeWindowProfileSchema)
+def create_time_profile(profile: TimeWindowProfileCreate, db: Session = Depends(get_admin_db)):
+    """Criar perfil de horário (janela compartilhada por várias credenciais)"""
+    if db.query(TimeWindowProfile.id).filter(TimeWindowProfile.name == profile.name).first():
+        raise HTTPException(status_code=400, detail="Perfil de horário já cadastrado")
+    
+    db_profile = TimeWindowProfile(**profile.dict())
+    db.add(db_profile)
+    db.commit()
+    db.refresh(db_profile)
+    return db_profile
+
+@router.get("/profiles", response_model=List[TimeWindowProfileSchema])
+def list_time_profiles(db: Session = Depends(get_admin_db)):
+    """Listar perfis de horário"""
+    return db.query(TimeWindowProfile).order_by(TimeWindowProfile.name).all()
+
+@router.get("/profiles/{profile_id}", response_model=TimeWindowProfileSchema)
+def get_time_profile(profile_id: uuid.UUID, db: Session = Depends(get_admin_db)):
+    """Obter perfil de horário por ID"""
+    profile = db.query(TimeWindowProfile).filter(TimeWindowProfile.id == profile_id).first()
+    if not profile:
+        raise HTTPException(status_code=404, detail="Perfil de horário não encontrado")
+    return profile
+
+@router.put("/profiles/{profile_id}", response_model=TimeWindowProfileSchema)
+def update_time_profile(profile_id: uuid.UUID, profile_update: TimeWindowProfileUpdate, db: Session = Depends(get_admin_db)):
+    """Atualizar perfil de horário - a nova janela vale para todas as credenciais do perfil"""
+    profile = db.query(TimeWindowProfile).filter(TimeWindowProfile.id == profile_id).first()
+    if not profile:
+        raise HTTPException(status_code=404, detail="Perfil de horário não encontrado")
+    
+    update_data = profile_update.dict(exclude_unset=True)
+    if "name" in update_data and update_data["name"] != profile.name:
+        if db.query(TimeWindowProfile.id).filter(TimeWindowProfile.name == update_data["name"]).first():
+            raise HTTPException(status_code=400, detail="Perfil de horário já cadastrado")
+    for field, value in update_data.items():
+        if value is not None:
+            setattr(profile, field, value)
+    
+    bump_credentials_version(db)
+    db.commit()
+    db.refresh(profile)
+    credential_snapshot.invalidate()
+    return profile
+
+@router.delete("/profiles/{profile_id}")
+def delete_time_profile(profile_id: uuid.UUID, db: Session = Depends(get_admin_db)):
+    """Remover perfil de horário sem credenciais atribuídas"""
+    profile = db.query(TimeWindowProfile).filter(TimeWindowProfile.id == profile_id).first()
+    if not profile:
+        raise HTTPException(status_code=404, detail="Perfil de horário não encontrado")
+    
+    in_use = db.query(func.count(RFIDCredential.id)).filter(RFIDCredential.time_profile_id == profile_id).scalar()
+    if in_use:
+        raise HTTPException(status_code=400, detail=f"Perfil de horário em uso por {in_use} credenciais")
+    
+    db.delete(profile)
+    db.commit()
+    return {"message": "Perfil de horário removido com sucesso"}
+
+# --------------------------
+# Credenciais
+# --------------------------
 @router.post("/credentials", response_model=RFIDCredentialSchema)
-def create_rfid_credential(credential: RFIDCredentialCreate, db: Session = Depends(get_db)):
+def create_rfid_credential(credential: RFIDCredentialCreate, db: Session = Depends(get_admin_db)):
     """Criar nova credencial RFID"""
     # Verificar se usuário existe
     user = db.query(User).filter(User.id == credential.user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    ensure_time_profile_exists(credential.time_profile_id, db)
     
     # Verificar se card_id já existe
     existing_credential = db.query(RFIDCredential).filter(RFIDCredential.card_id == credential.card_id).first()
@@ -24,28 +132,90 @@ def create_rfid_credential(credential: RFIDCredentialCreate, db: Session = Depen
         raise HTTPException(status_code=400, detail="Card ID já cadastrado")
     
     db_credential = RFIDCredential(**credential.dict())
+    apply_time_profile_rule(db_credential, credential.model_fields_set)
     db.add(db_credential)
+    bump_credentials_version(db)
     db.commit()
     db.refresh(db_credential)
+    response_cache.invalidate("rfid")
+    credential_snapshot.invalidate()
     return db_credential
 
+@router.post("/credentials/profile-assignment", response_model=CredentialProfileAssignmentResult)
+def assign_time_profile(assignment: CredentialProfileAssignment, db: Session = Depends(get_admin_db)):
+    """
+    Atribuir (ou remover, com time_profile_id nulo) um perfil de horário a várias
+    credenciais em um único UPDATE. As credenciais são selecionadas pela
+    interseção dos critérios informados; ao menos um critério é obrigatório.
+    """
+    ensure_time_profile_exists(assignment.time_profile_id, db)
+    
+    criteria = []
+    if assignment.credential_ids is not None:
+        criteria.append(RFIDCredential.id.in_(assignment.credential_ids))
+    if assignment.card_ids is not None:
+        criteria.append(RFIDCredential.card_id.in_(assignment.card_ids))
+    if assignment.user_ids is not None:
+        criteria.append(RFIDCredential.user_id.in_(assignment.user_ids))
+    if assignment.current_time_profile_id is not None:
+        criteria.append(RFIDCredential.time_profile_id == assignment.current_time_profile_id)
+    if assignment.time_window_start is not None:
+        criteria.append(RFIDCredential.time_window_start == assignment.time_window_start)
+    if assignment.time_window_end is not None:
+        criteria.append(RFIDCredential.time_window_end == assignment.time_window_end)
+    if not criteria:
+        raise HTTPException(status_code=400, detail="Informe ao menos um critério de seleção")
+    if assignment.only_active:
+        criteria.append(RFIDCredential.is_active == True)
+    
+    # UPDATE em lote não passa pelos eventos do ORM: a versão é incrementada aqui
+    values = {"time_profile_id": assignment.time_profile_id, "version": RFIDCredential.version + 1}
+    if assignment.time_profile_id is not None:
+        values["has_time_restriction"] = True
+    else:
+        # Sem perfil, a restrição volta a depender da janela própria da credencial
+        values["has_time_restriction"] = case(
+            (and_(RFIDCredential.time_window_start.isnot(None), RFIDCredential.time_window_end.isnot(None)), True),
+            else_=False
+        )
+    result = db.execute(
+        update(RFIDCredential)
+        .where(*criteria)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        bump_credentials_version(db)
+    db.commit()
+    if result.rowcount:
+        response_cache.invalidate("rfid")
+        credential_snapshot.invalidate()
+    return {"updated": result.rowcount}
+
 @router.get("/credentials", response_model=List[RFIDCredentialSchema])
-def list_rfid_credentials(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def list_rfid_credentials(skip: int = 0, limit: int = 100, db: Session = Depends(get_admin_db)):
     """Listar credenciais RFID"""
     credentials = db.query(RFIDCredential).offset(skip).limit(limit).all()
     return credentials
 
 @router.get("/credentials/all", response_model=List[RFIDCredentialSchema])
-def list_all_rfid_credentials(db: Session = Depends(get_db)):
-    """Listar todas as credenciais RFID (sem paginação)"""
-    credentials = db.query(RFIDCredential).all()
-    return credentials
+def list_all_rfid_credentials(request: Request, db: Session = Depends(get_reporting_db)):
+    """Listar todas as credenciais RFID (sem paginação) - com ETag"""
+    total, version = db.query(
+        func.count(RFIDCredential.id),
+        func.coalesce(func.sum(RFIDCredential.version), 0)
+    ).one()
+    etag = make_etag("rfid", total, version)
+    return cached_response(
+        request, ("rfid", "all"), etag,
+        lambda: render_json_list(credentials_adapter, db.query(RFIDCredential).order_by(RFIDCredential.id).all())
+    )
 
 @router.get("/credentials/sync")
 def sync_rfid_credentials(
     page: int = 1, 
     page_size: int = 40,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_sync_db)
 ):
     """Sincronizar credenciais RFID para dispositivos embarcados - com paginação"""
     
@@ -84,49 +254,109 @@ def sync_rfid_credentials(
     }
 
 @router.get("/credentials/{credential_id}", response_model=RFIDCredentialSchema)
-def get_rfid_credential(credential_id: str, db: Session = Depends(get_db)):
-    """Obter credencial RFID por ID"""
+def get_rfid_credential(credential_id: str, request: Request, db: Session = Depends(get_admin_db)):
+    """Obter credencial RFID por ID - com ETag"""
     credential = db.query(RFIDCredential).filter(RFIDCredential.id == credential_id).first()
     if not credential:
         raise HTTPException(status_code=404, detail="Credencial não encontrada")
-    return credential
+    etag = make_etag("rfid", credential.id, credential.version)
+    return cached_response(
+        request, ("rfid", str(credential.id)), etag,
+        lambda: RFIDCredentialSchema.model_validate(credential).model_dump_json().encode()
+    )
 
 @router.put("/credentials/{credential_id}", response_model=RFIDCredentialSchema)
-def update_rfid_credential(credential_id: str, credential_update: RFIDCredentialUpdate, db: Session = Depends(get_db)):
+def update_rfid_credential(credential_id: str, credential_update: RFIDCredentialUpdate, db: Session = Depends(get_admin_db)):
     """Atualizar credencial RFID"""
     credential = db.query(RFIDCredential).filter(RFIDCredential.id == credential_id).first()
     if not credential:
         raise HTTPException(status_code=404, detail="Credencial não encontrada")
     
     update_data = credential_update.dict(exclude_unset=True)
+    ensure_time_profile_exists(update_data.get("time_profile_id"), db)
     for field, value in update_data.items():
         setattr(credential, field, value)
+    apply_time_profile_rule(credential, set(update_data))
     
+    bump_credentials_version(db)
     db.commit()
     db.refresh(credential)
+    response_cache.invalidate("rfid")
+    credential_snapshot.invalidate()
     return credential
 
-@router.post("/validate-access")
-def validate_rfid_access(access_request: RFIDAccessRequest, db: Session = Depends(get_db)):
-    """Validar acesso RFID - endpoint para o sistema local"""
+def record_access(db: Session, event_type: EventType, location: str, description: str,
+                  credential: Optional[CredentialRecord] = None):
+    """Gravar o log de acesso e alimentar a janela de analytics com o mesmo evento"""
+    user_id = credential.user_id if credential else None
+    credential_id = credential.credential_id if credential else None
+    card_id = credential.card_id if credential else None
     
-    # Buscar credencial RFID
+    access_log = AccessLog(
+        user_id=user_id,
+        rfid_credential_id=credential_id,
+        event_type=event_type,
+        location=location,
+        description=description
+    )
+    db.add(access_log)
+    db.commit()
+    
+    access_analytics.record(event_type, location, card_id=card_id, user_id=user_id, credential_id=credential_id)
+
+def find_active_credential(card_id: str, db: Session) -> Optional[CredentialRecord]:
+    """Buscar credencial ativa no snapshot compartilhado; se ele estiver desatualizado, no banco"""
+    index = credential_snapshot.current(db)
+    if index is not None:
+        return index.lookup(card_id)
+    
+    credential_snapshot.request_rebuild(SessionLocal)
     credential = db.query(RFIDCredential).filter(
-        RFIDCredential.card_id == access_request.card_id,
+        RFIDCredential.card_id == card_id,
         RFIDCredential.is_active == True
     ).first()
+    if not credential:
+        return None
+    window = credential.time_profile or credential
+    return CredentialRecord(
+        card_id=credential.card_id,
+        credential_id=credential.id,
+        user_id=credential.user_id,
+        user_name=credential.user.full_name,
+        user_email=credential.user.email,
+        user_active=credential.user.is_active,
+        has_time_restriction=credential.has_time_restriction,
+        window_start=window_to_minutes(window.time_window_start),
+        window_end=window_to_minutes(window.time_window_end)
+    )
+
+def within_time_window(start_minutes: int, end_minutes: int) -> bool:
+    """Verificar se o horário atual (America/Sao_Paulo) está dentro da janela"""
+    if start_minutes == NO_WINDOW or end_minutes == NO_WINDOW:
+        # Restrição de horário sem janela definida: nega por segurança
+        return False
+    
+    current_time = datetime.now(brazil_timezone())
+    current_minutes = current_time.hour * 60 + current_time.minute
+    
+    # Verificar se a janela cruza meia-noite (ex: 22:00-06:00)
+    if start_minutes > end_minutes:
+        return current_minutes >= start_minutes or current_minutes <= end_minutes
+    return start_minutes <= current_minutes <= end_minutes
+
+@router.post("/validate-access")
+def validate_rfid_access(access_request: RFIDAccessRequest, db: Session = Depends(get_access_db)):
+    """Validar acesso RFID - endpoint para o sistema local"""
+    
+    # Buscar credencial RFID
+    credential = find_active_credential(access_request.card_id, db)
     
     if not credential:
         # Log de acesso negado - card não encontrado
-        access_log = AccessLog(
-            user_id=None,
-            rfid_credential_id=None,
-            event_type=EventType.CARD_NOT_FOUND,
-            location=access_request.location,
-            description=f"Card ID {access_request.card_id} não encontrado"
+        record_access(
+            db, EventType.CARD_NOT_FOUND, access_request.location,
+            f"Card ID {access_request.card_id} não encontrado"
         )
-        db.add(access_log)
-        db.commit()
         
         return {
             "access_granted": False,
@@ -140,23 +370,15 @@ def validate_rfid_access(access_request: RFIDAccessRequest, db: Session = Depend
         }
     
     # Verificar se usuário está ativo
-    if not credential.user.is_active:
+    if not credential.user_active:
         # Log de acesso negado - usuário inativo
-        access_log = AccessLog(
-            user_id=credential.user_id,
-            rfid_credential_id=credential.id,
-            event_type=EventType.ACCESS_DENIED,
-            location=access_request.location,
-            description="Usuário inativo"
-        )
-        db.add(access_log)
-        db.commit()
+        record_access(db, EventType.ACCESS_DENIED, access_request.location, "Usuário inativo", credential)
         
         return {
             "access_granted": False,
-            "user_name": credential.user.full_name,
+            "user_name": credential.user_name,
             "user_id": str(credential.user_id),
-            "user_email": credential.user.email,
+            "user_email": credential.user_email,
             "message": "Usuário inativo",
             "has_time_restriction": credential.has_time_restriction,
             "time_window_start": credential.time_window_start,
@@ -165,45 +387,19 @@ def validate_rfid_access(access_request: RFIDAccessRequest, db: Session = Depend
     
     # Verificar restrição de horário
     if credential.has_time_restriction:
-        # Obter horário atual em UTC-3 (Brasil)
-        tz_brazil = pytz.timezone('America/Sao_Paulo')
-        current_time = datetime.now(tz_brazil)
-        current_hour_minute = current_time.strftime("%H:%M")
-        
-        # Converter strings de horário para minutos desde meia-noite para comparação
-        def time_to_minutes(time_str):
-            hours, minutes = map(int, time_str.split(':'))
-            return hours * 60 + minutes
-        
-        current_minutes = time_to_minutes(current_hour_minute)
-        start_minutes = time_to_minutes(credential.time_window_start)
-        end_minutes = time_to_minutes(credential.time_window_end)
-        
-        # Verificar se a janela cruza meia-noite (ex: 22:00-06:00)
-        if start_minutes > end_minutes:
-            # Janela cruza meia-noite
-            access_allowed = current_minutes >= start_minutes or current_minutes <= end_minutes
-        else:
-            # Janela normal
-            access_allowed = start_minutes <= current_minutes <= end_minutes
-        
-        if not access_allowed:
+        if not within_time_window(credential.window_start, credential.window_end):
             # Log de acesso negado - fora do horário
-            access_log = AccessLog(
-                user_id=credential.user_id,
-                rfid_credential_id=credential.id,
-                event_type=EventType.ACCESS_DENIED,
-                location=access_request.location,
-                description=f"Fora do horário permitido ({credential.time_window_start}-{credential.time_window_end})"
+            record_access(
+                db, EventType.ACCESS_DENIED, access_request.location,
+                f"Fora do horário permitido ({credential.time_window_start}-{credential.time_window_end})",
+                credential
             )
-            db.add(access_log)
-            db.commit()
             
             return {
                 "access_granted": False,
-                "user_name": credential.user.full_name,
+                "user_name": credential.user_name,
                 "user_id": str(credential.user_id),
-                "user_email": credential.user.email,
+                "user_email": credential.user_email,
                 "message": "Fora do horário permitido",
                 "has_time_restriction": True,
                 "time_window_start": credential.time_window_start,
@@ -211,21 +407,17 @@ def validate_rfid_access(access_request: RFIDAccessRequest, db: Session = Depend
             }
     
     # Acesso concedido
-    access_log = AccessLog(
-        user_id=credential.user_id,
-        rfid_credential_id=credential.id,
-        event_type=EventType.ACCESS_GRANTED,
-        location=access_request.location,
-        description=f"Acesso concedido para {credential.user.full_name}"
+    record_access(
+        db, EventType.ACCESS_GRANTED, access_request.location,
+        f"Acesso concedido para {credential.user_name}",
+        credential
     )
-    db.add(access_log)
-    db.commit()
     
     return {
         "access_granted": True,
-        "user_name": credential.user.full_name,
+        "user_name": credential.user_name,
         "user_id": str(credential.user_id),
-        "user_email": credential.user.email,
+        "user_email": credential.user_email,
         "message": "Acesso liberado",
         "has_time_restriction": credential.has_time_restriction,
         "time_window_start": credential.time_window_start if credential.has_time_restriction else "00:00",
@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List
-from app.database import get_db
+from app.cache import cached_response, make_etag, response_cache
+from app.credential_snapshot import bump_credentials_version, credential_snapshot
 from app.models import User
 from app.schemas import UserCreate, UserUpdate, User as UserSchema
+from app.workload import WorkloadRoute, render_json_list, get_admin_db, get_reporting_db
 
-router = APIRouter()
+router = APIRouter(route_class=WorkloadRoute)
+
+users_adapter = TypeAdapter(List[UserSchema])
 
 @router.post("/", response_model=UserSchema)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+def create_user(user: UserCreate, db: Session = Depends(get_admin_db)):
     """Criar novo usuário"""
     # Verificar se email já existe
     existing_user = db.query(User).filter(User.email == user.email).first()
@@ -19,30 +25,39 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    response_cache.invalidate("users")
     return db_user
 
 @router.get("/", response_model=List[UserSchema])
-def list_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def list_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_admin_db)):
     """Listar usuários"""
     users = db.query(User).offset(skip).limit(limit).all()
     return users
 
 @router.get("/all", response_model=List[UserSchema])
-def list_all_users(db: Session = Depends(get_db)):
-    """Listar todos os usuários (sem paginação)"""
-    users = db.query(User).all()
-    return users
+def list_all_users(request: Request, db: Session = Depends(get_reporting_db)):
+    """Listar todos os usuários (sem paginação) - com ETag"""
+    total, version = db.query(func.count(User.id), func.coalesce(func.sum(User.version), 0)).one()
+    etag = make_etag("users", total, version)
+    return cached_response(
+        request, ("users", "all"), etag,
+        lambda: render_json_list(users_adapter, db.query(User).order_by(User.id).all())
+    )
 
 @router.get("/{user_id}", response_model=UserSchema)
-def get_user(user_id: str, db: Session = Depends(get_db)):
-    """Obter usuário por ID"""
+def get_user(user_id: str, request: Request, db: Session = Depends(get_admin_db)):
+    """Obter usuário por ID - com ETag"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
-    return user
+    etag = make_etag("users", user.id, user.version)
+    return cached_response(
+        request, ("users", str(user.id)), etag,
+        lambda: UserSchema.model_validate(user).model_dump_json().encode()
+    )
 
 @router.put("/{user_id}", response_model=UserSchema)
-def update_user(user_id: str, user_update: UserUpdate, db: Session = Depends(get_db)):
+def update_user(user_id: str, user_update: UserUpdate, db: Session = Depends(get_admin_db)):
     """Atualizar usuário"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -52,17 +67,23 @@ def update_user(user_id: str, user_update: UserUpdate, db: Session = Depends(get
     for field, value in update_data.items():
         setattr(user, field, value)
     
+    bump_credentials_version(db)
     db.commit()
     db.refresh(user)
+    response_cache.invalidate("users")
+    credential_snapshot.invalidate()
     return user
 
 @router.delete("/{user_id}")
-def delete_user(user_id: str, db: Session = Depends(get_db)):
+def delete_user(user_id: str, db: Session = Depends(get_admin_db)):
     """Desativar usuário (soft delete)"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
     user.is_active = False
+    bump_credentials_version(db)
     db.commit()
+    response_cache.invalidate("users")
+    credential_snapshot.invalidate()
     return {"message": "Usuário desativado com sucesso"}
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
 from app.models import EventType, ErrorSeverity
@@ -26,6 +26,30 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+# Schemas para Time Window Profile
+TIME_WINDOW_PATTERN = r"^([01]\d|2[0-3]):[0-5]\d$"
+
+class TimeWindowProfileBase(BaseModel):
+    name: str
+    time_window_start: str = Field(pattern=TIME_WINDOW_PATTERN)
+    time_window_end: str = Field(pattern=TIME_WINDOW_PATTERN)
+
+class TimeWindowProfileCreate(TimeWindowProfileBase):
+    pass
+
+class TimeWindowProfileUpdate(BaseModel):
+    name: Optional[str] = None
+    time_window_start: Optional[str] = Field(default=None, pattern=TIME_WINDOW_PATTERN)
+    time_window_end: Optional[str] = Field(default=None, pattern=TIME_WINDOW_PATTERN)
+
+class TimeWindowProfile(TimeWindowProfileBase):
+    id: uuid.UUID
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 # Schemas para RFID Credential
 class RFIDCredentialBase(BaseModel):
     card_id: str
@@ -33,6 +57,7 @@ class RFIDCredentialBase(BaseModel):
     has_time_restriction: bool = False
     time_window_start: Optional[str] = None
     time_window_end: Optional[str] = None
+    time_profile_id: Optional[uuid.UUID] = None
 
 class RFIDCredentialCreate(RFIDCredentialBase):
     user_id: uuid.UUID
@@ -43,6 +68,7 @@ class RFIDCredentialUpdate(BaseModel):
     has_time_restriction: Optional[bool] = None
     time_window_start: Optional[str] = None
     time_window_end: Optional[str] = None
+    time_profile_id: Optional[uuid.UUID] = None
 
 class RFIDCredential(RFIDCredentialBase):
     id: uuid.UUID
@@ -53,6 +79,20 @@ class RFIDCredential(RFIDCredentialBase):
     class Config:
         from_attributes = True
 
+# Atribuição de perfil de horário em lote: credenciais selecionadas por IDs e/ou critérios
+class CredentialProfileAssignment(BaseModel):
+    time_profile_id: Optional[uuid.UUID] = None  # None remove o perfil
+    credential_ids: Optional[List[uuid.UUID]] = None
+    card_ids: Optional[List[str]] = None
+    user_ids: Optional[List[uuid.UUID]] = None
+    current_time_profile_id: Optional[uuid.UUID] = None
+    time_window_start: Optional[str] = None  # janela própria atual (ex.: migrar todos os 22:00-06:00)
+    time_window_end: Optional[str] = None
+    only_active: bool = False
+
+class CredentialProfileAssignmentResult(BaseModel):
+    updated: int
+
 # Schemas para Access Log
 class AccessLogBase(BaseModel):
     event_type: EventType
@@ -65,13 +105,26 @@ class AccessLogCreate(AccessLogBase):
 
 class AccessLog(AccessLogBase):
     id: uuid.UUID
-    user_id: uuid.UUID
-    rfid_credential_id: uuid.UUID
+    user_id: Optional[uuid.UUID] = None
+    rfid_credential_id: Optional[uuid.UUID] = None
     timestamp: datetime
     
     class Config:
         from_attributes = True
 
+# Schemas para consultas analíticas sobre logs de acesso
+class AccessEvent(BaseModel):
+    timestamp: datetime
+    event_type: EventType
+    location: str
+    card_id: Optional[str] = None
+    user_id: Optional[uuid.UUID] = None
+    rfid_credential_id: Optional[uuid.UUID] = None
+
+class AccessGroupCount(BaseModel):
+    key: str
+    count: int
+
 # Schemas para Error Log
 class ErrorLogBase(BaseModel):
     error_type: str
@@ -85,10 +138,19 @@ class ErrorLogCreate(ErrorLogBase):
 class ErrorLog(ErrorLogBase):
     id: uuid.UUID
     timestamp: datetime
+    occurrences: int = 1
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
+class ErrorLogBatchResult(BaseModel):
+    received: int
+    coalesced: int
+    inserted: int
+    updated: int
+
 # Schemas para HTTP Log
 class HttpLogBase(BaseModel):
     method: str
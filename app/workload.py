@@ -0,0 +1,167 @@
+"""
+Isolamento de carga por classe de rota
+
+Cada classe (settings.WORKLOADS) tem o próprio pool de conexões, limite de
+concorrência e statement timeout, para que relatórios e administração não
+disputem recursos com as decisões de acesso nas portas:
+
+  • access     validate-access - nunca rejeitado
+  • sync       sincronização e erros enviados pelos dispositivos
+  • admin      CRUD de usuários e credenciais
+  • reporting  listagens completas, logs e consultas analíticas
+
+A admissão acontece antes de a requisição ocupar uma thread do threadpool:
+quando a classe está no limite de concorrência e a fila já tem `max_queue`
+requisições aguardando (ou a espera passa de `queue_timeout_seconds`), a
+requisição é rejeitada com 503 e `Retry-After`.
+
+Todas as rotas são `def` síncronas e dividem o threadpool padrão do anyio:
+configure_threads() o dimensiona para a soma das concorrências das classes mais
+THREADPOOL_HEADROOM, para que uma classe nunca ocupe as threads admitidas para
+outra, e reduz o intervalo de troca do GIL (GIL_SWITCH_INTERVAL_MS): a cada ida
+ao banco a thread da porta solta o GIL e, com um relatório ocupando a CPU,
+esperava até 5 ms (o padrão do Python) para retomá-lo. As rotas usam WorkloadRoute, que fecha a sessão (devolvendo a conexão ao
+pool) na própria thread do endpoint, sem outro salto pelo threadpool.
+
+Listagens grandes são serializadas com render_json_list, em blocos: cada chamada
+ao pydantic-core segura o GIL até terminar, e uma única chamada sobre dezenas de
+milhares de linhas travava as threads das portas por centenas de milissegundos.
+"""
+
+from typing import Dict
+import asyncio
+import functools
+import sys
+
+import anyio
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import workload_session
+
+# Chave em Session.info que marca as sessões abertas por workload_db
+WORKLOAD_SESSION_KEY = "workload"
+# Linhas por chamada ao pydantic-core em render_json_list
+RENDER_CHUNK_ROWS = 1000
+
+
+class AdmissionGate:
+    """Semáforo com fila limitada para uma classe de carga"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, queue_timeout_seconds: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout_seconds or None
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def _reject(self):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=503,
+            detail=f"Servidor ocupado (classe {self.name}), tente novamente",
+            headers={"Retry-After": "1"}
+        )
+
+    async def acquire(self):
+        if self._semaphore.locked() and 0 <= self.max_queue <= self.waiting:
+            self._reject()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected
+        }
+
+
+gates: Dict[str, AdmissionGate] = {
+    name: AdmissionGate(name, config["concurrency"], config["max_queue"], config["queue_timeout_seconds"])
+    for name, config in settings.WORKLOADS.items()
+}
+
+
+def configure_threads():
+    """Garantir threads para a concorrência de todas as classes e ajustar o GIL (chamar no lifespan)"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    needed = sum(max(config["concurrency"], 0) for config in settings.WORKLOADS.values()) + settings.THREADPOOL_HEADROOM
+    limiter.total_tokens = max(limiter.total_tokens, needed)
+    if settings.GIL_SWITCH_INTERVAL_MS > 0:
+        sys.setswitchinterval(settings.GIL_SWITCH_INTERVAL_MS / 1000)
+
+
+def workload_db(workload: str):
+    """Dependency: admitir a requisição na classe de carga e fornecer uma sessão do seu pool"""
+    gate = gates[workload]
+
+    async def dependency():
+        await gate.acquire()
+        try:
+            db = workload_session(workload)
+            db.info[WORKLOAD_SESSION_KEY] = workload
+            try:
+                yield db
+            finally:
+                # Já fechada pela WorkloadRoute na thread do endpoint; aqui só sobra
+                # o caso em que o endpoint não chegou a rodar (sem conexão aberta)
+                db.close()
+        finally:
+            gate.release()
+
+    return dependency
+
+
+class WorkloadRoute(APIRoute):
+    """Rota que fecha as sessões das classes de carga na thread do próprio endpoint"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        call = self.dependant.call
+        if call is None or asyncio.iscoroutinefunction(call):
+            return
+
+        @functools.wraps(call)
+        def call_and_close(**values):
+            try:
+                return call(**values)
+            finally:
+                for value in values.values():
+                    if isinstance(value, Session) and WORKLOAD_SESSION_KEY in value.info:
+                        value.close()
+
+        # O handler da rota lê dependant.call a cada requisição
+        self.dependant.call = call_and_close
+
+
+get_access_db = workload_db("access")
+get_sync_db = workload_db("sync")
+get_admin_db = workload_db("admin")
+get_reporting_db = workload_db("reporting")
+
+
+def render_json_list(adapter: TypeAdapter, rows: list) -> bytes:
+    """JSON de uma lista (adapter de List[Schema]) serializada em blocos de RENDER_CHUNK_ROWS linhas"""
+    parts = [
+        adapter.dump_json(adapter.validate_python(rows[i:i + RENDER_CHUNK_ROWS], from_attributes=True))[1:-1]
+        for i in range(0, len(rows), RENDER_CHUNK_ROWS)
+    ]
+    return b"[" + b",".join(parts) + b"]"
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Script para arquivar logs de acesso antigos (anteriores a ACCESS_LOG_HOT_DAYS)
+em arquivos comprimidos - útil para execução via cron
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.archive import archive_access_logs
+from app.database import SessionLocal
+
+def archive():
+    """Arquivar logs de acesso fora da janela quente"""
+    db = SessionLocal()
+    try:
+        print("📦 Arquivando logs de acesso antigos...")
+        archived = archive_access_logs(db)
+        print(f"✅ {archived} logs de acesso arquivados")
+    except Exception as e:
+        print(f"❌ Erro ao arquivar logs: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    archive()
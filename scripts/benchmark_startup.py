@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark do tempo de startup da API
+
+Mede, em processos Python novos (como um worker recém-criado):
+  • import     - tempo para importar app.main
+  • lifespan   - tempo até o fim do lifespan de startup (engine, pool e caches)
+  • bootstrap  - tempo da etapa de banco do container: scripts/bootstrap.py ou, em
+                 checkouts anteriores a ele, create_tables.py seguido de seed_data.py
+  • ready      - do início do container (etapa de banco + uvicorn) até o /ready
+                 responder 200 (/health em checkouts sem /ready), com o snapshot de
+                 credenciais em um diretório vazio, como em um container novo
+As etapas com banco requerem DATABASE_URL acessível e medem o caso de restart ou
+scale-out: schema e dados iniciais já aplicados.
+
+Uso: python scripts/benchmark_startup.py [--runs N] [--skip-lifespan] [--skip-container] [--root DIR]
+     (--root mede outro checkout, ex.: um `git worktree` da versão anterior)
+"""
+
+import argparse
+import os
+import socket
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import app.main
+print(time.perf_counter() - start)
+"""
+
+LIFESPAN_SNIPPET = """
+import asyncio, time
+start = time.perf_counter()
+import app.main
+
+async def run():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        print(time.perf_counter() - start)
+
+asyncio.run(run())
+"""
+
+def measure(snippet: str, runs: int, root: str) -> list:
+    """Executar o trecho em processos novos e retornar os tempos em segundos"""
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", snippet],
+            cwd=root, capture_output=True, text=True, check=True
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+def bootstrap_commands(root: str) -> list:
+    """Comandos da etapa de banco do container neste checkout"""
+    if os.path.exists(os.path.join(root, "scripts", "bootstrap.py")):
+        return [[sys.executable, "scripts/bootstrap.py"]]
+    return [[sys.executable, "scripts/create_tables.py"], [sys.executable, "scripts/seed_data.py"]]
+
+def run_bootstrap(root: str):
+    for command in bootstrap_commands(root):
+        subprocess.run(command, cwd=root, capture_output=True, check=True)
+
+def measure_bootstrap(runs: int, root: str) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_bootstrap(root)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def ready_status(port: int) -> int:
+    """Status do /ready (ou /health, se o checkout não tiver /ready); 0 se não responder"""
+    for path in ("/ready", "/health"):
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+                return response.status
+        except urllib.error.HTTPError as error:
+            if error.code != 404:
+                return error.code
+        except OSError:
+            return 0
+    return 0
+
+def measure_ready(runs: int, root: str, timeout: float = 60) -> list:
+    timings = []
+    for _ in range(runs):
+        port = free_port()
+        snapshot_dir = tempfile.mkdtemp(prefix="safeway-benchmark-")
+        env = dict(os.environ, CREDENTIAL_SNAPSHOT_PATH=os.path.join(snapshot_dir, "credentials.snapshot"))
+        start = time.perf_counter()
+        run_bootstrap(root)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            while ready_status(port) != 200:
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError(f"API não ficou pronta em {timeout}s")
+                time.sleep(0.02)
+            timings.append(time.perf_counter() - start)
+        finally:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+    return timings
+
+def report(label: str, timings: list):
+    print(
+        f"{label:<10} mediana={statistics.median(timings) * 1000:8.1f} ms  "
+        f"min={min(timings) * 1000:8.1f} ms  max={max(timings) * 1000:8.1f} ms  (n={len(timings)})"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de startup da SafeWay API")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-lifespan", action="store_true", help="Não medir o lifespan (sem banco)")
+    parser.add_argument("--skip-container", action="store_true", help="Não medir bootstrap e ready")
+    parser.add_argument("--root", default=ROOT, help="Checkout a medir (padrão: este)")
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+
+    print(f"⏱️  Medindo tempo de startup de {root}...")
+    report("import", measure(IMPORT_SNIPPET, args.runs, root))
+    if not args.skip_lifespan:
+        report("lifespan", measure(LIFESPAN_SNIPPET, args.runs, root))
+    if not args.skip_container:
+        report("bootstrap", measure_bootstrap(args.runs, root))
+        report("ready", measure_ready(args.runs, root))
+
+if __name__ == "__main__":
+    main()
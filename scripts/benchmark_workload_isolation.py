@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark de isolamento de carga
+
+Dispara requisições concorrentes de relatório (/logs/access/all,
+/rfid/credentials/all, /users/all) e de administração (listagens paginadas)
+enquanto mede a latência do validate-access, e resume percentis e respostas
+503 por classe.
+
+Uso: python scripts/benchmark_workload_isolation.py [--base-url URL] [--seconds N]
+     [--reporting-clients N] [--admin-clients N] [--door-clients N]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import httpx
+
+REPORTING_PATHS = ["/api/v1/logs/access/all", "/api/v1/rfid/credentials/all", "/api/v1/users/all"]
+ADMIN_PATHS = ["/api/v1/users/", "/api/v1/rfid/credentials", "/api/v1/rfid/profiles"]
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def get_load(base_url: str, paths: list, stop: threading.Event, statuses: list):
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        i = 0
+        while not stop.is_set():
+            statuses.append(client.get(paths[i % len(paths)]).status_code)
+            i += 1
+
+def door_load(base_url: str, stop: threading.Event, latencies: list, statuses: list):
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.post("/api/v1/rfid/validate-access", json={"card_id": "RFID009", "location": "Benchmark"})
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de isolamento de carga da SafeWay API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--seconds", type=int, default=15)
+    parser.add_argument("--reporting-clients", type=int, default=16)
+    parser.add_argument("--admin-clients", type=int, default=16)
+    parser.add_argument("--door-clients", type=int, default=4)
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    door_latencies, door_statuses, reporting_statuses, admin_statuses = [], [], [], []
+    threads = [
+        threading.Thread(target=get_load, args=(args.base_url, REPORTING_PATHS, stop, reporting_statuses))
+        for _ in range(args.reporting_clients)
+    ] + [
+        threading.Thread(target=get_load, args=(args.base_url, ADMIN_PATHS, stop, admin_statuses))
+        for _ in range(args.admin_clients)
+    ] + [
+        threading.Thread(target=door_load, args=(args.base_url, stop, door_latencies, door_statuses))
+        for _ in range(args.door_clients)
+    ]
+
+    print(f"⏱️  {args.reporting_clients} clientes de relatório + {args.admin_clients} de administração + "
+          f"{args.door_clients} portas por {args.seconds}s...")
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"validate-access: {len(door_latencies)} requisições, "
+          f"p50={statistics.median(door_latencies) * 1000:.1f} ms  "
+          f"p99={percentile(door_latencies, 0.99) * 1000:.1f} ms  "
+          f"max={max(door_latencies) * 1000:.1f} ms  "
+          f"não-200={sum(1 for s in door_statuses if s != 200)}")
+    print(f"relatórios:      {len(reporting_statuses)} requisições, "
+          f"503={sum(1 for s in reporting_statuses if s == 503)}")
+    print(f"administração:   {len(admin_statuses)} requisições, "
+          f"503={sum(1 for s in admin_statuses if s == 503)}")
+
+if __name__ == "__main__":
+    main()
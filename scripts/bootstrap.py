@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Script de inicialização do banco: cria o schema e popula os dados iniciais
+em um único processo. Cada etapa é ignorada quando já foi aplicada, e um
+advisory lock do PostgreSQL garante que apenas um container a execute por vez.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.database import get_engine
+from create_tables import create_tables
+from seed_data import seed_data
+
+# Chave arbitrária do advisory lock de bootstrap
+BOOTSTRAP_LOCK_KEY = 727001
+
+def bootstrap():
+    """Aplicar schema e dados iniciais, se necessário"""
+    engine = get_engine()
+    if engine.dialect.name != "postgresql":
+        create_tables()
+        seed_data()
+        return
+    
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+        try:
+            create_tables()
+            seed_data()
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+
+if __name__ == "__main__":
+    bootstrap()
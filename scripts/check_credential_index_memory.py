@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Verificação do orçamento de memória do índice compacto de credenciais
+
+Gera credenciais sintéticas típicas (card_id de 14 bytes, nome + e-mail
+~50 bytes, um cartão por usuário), confere que o índice respeita
+BYTES_PER_CREDENTIAL_BUDGET e que o arquivo mapeado em memória devolve
+os mesmos resultados. Termina com código 1 se o orçamento for excedido.
+
+Uso: python scripts/check_credential_index_memory.py [--count N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.credential_index import (
+    BYTES_PER_CREDENTIAL_BUDGET,
+    FIXED_BYTES_PER_CREDENTIAL,
+    FIXED_BYTES_PER_USER,
+    CredentialIndex,
+)
+
+def synthetic_rows(count: int):
+    for i in range(count):
+        restricted = i % 3 == 0
+        yield (
+            uuid.uuid4(), f"CARD{i:010d}", restricted,
+            "22:00" if restricted else None, "06:00" if restricted else None,
+            uuid.uuid4(), f"Usuário {i:07d}", f"usuario{i:07d}@empresa.com", True
+        )
+
+def check_memory_budget(count: int) -> bool:
+    index = CredentialIndex.from_rows(synthetic_rows(count))
+    per_credential = index.nbytes / count
+
+    card_width = index.card_ids.dtype.itemsize
+    strings = index.name_data.nbytes + index.email_data.nbytes
+    expected = count * (FIXED_BYTES_PER_CREDENTIAL + card_width + FIXED_BYTES_PER_USER) + strings + 2 * 4
+
+    print(f"📦 {count} credenciais: {index.nbytes / 1024 / 1024:.1f} MiB ({per_credential:.1f} bytes/credencial)")
+    print(f"   orçamento: {BYTES_PER_CREDENTIAL_BUDGET} bytes/credencial")
+
+    ok = per_credential <= BYTES_PER_CREDENTIAL_BUDGET and index.nbytes == expected
+    if index.nbytes != expected:
+        print(f"❌ Layout diferente do documentado: {index.nbytes} != {expected} bytes")
+
+    # O arquivo mapeado precisa responder igual ao índice em memória
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "credentials.idx")
+        index.save(path)
+        mapped = CredentialIndex.open(path)
+        for card_id in ("CARD0000000000", f"CARD{count - 1:010d}", "CARD9999999999X"):
+            a, b = index.lookup(card_id), mapped.lookup(card_id)
+            if (a is None) != (b is None) or (a and (a.credential_id, a.user_name, a.window_start)
+                                               != (b.credential_id, b.user_name, b.window_start)):
+                print(f"❌ Lookup divergente no arquivo mapeado para {card_id}")
+                ok = False
+        print(f"   arquivo mapeado: {os.path.getsize(path) / 1024 / 1024:.1f} MiB")
+
+    print("✅ Orçamento respeitado" if ok else "❌ Orçamento excedido")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica o orçamento de memória do índice de credenciais")
+    parser.add_argument("--count", type=int, default=200_000)
+    args = parser.parse_args()
+    sys.exit(0 if check_memory_budget(args.count) else 1)
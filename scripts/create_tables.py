@@ -7,14 +7,61 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.database import engine, Base
-from app.models import User, RFIDCredential, AccessLog, ErrorLog, HttpLog
+from sqlalchemy import inspect, text
+from app.database import get_engine, Base
+from app.models import User, TimeWindowProfile, RFIDCredential, AccessLog, ErrorLog, HttpLog
+
+# Alterações idempotentes em tabelas já existentes: o create_all só cria tabelas
+# novas, então colunas acrescentadas aos modelos precisam ser aplicadas aqui
+SCHEMA_UPGRADES = [
+    # Agrupamento de erros repetidos (error_logs)
+    "ALTER TABLE error_logs ADD COLUMN IF NOT EXISTS occurrences INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE error_logs ADD COLUMN IF NOT EXISTS first_seen TIMESTAMP WITH TIME ZONE",
+    "ALTER TABLE error_logs ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP WITH TIME ZONE",
+    "UPDATE error_logs SET first_seen = timestamp WHERE first_seen IS NULL",
+    "UPDATE error_logs SET last_seen = timestamp WHERE last_seen IS NULL",
+    "ALTER TABLE error_logs ALTER COLUMN first_seen SET DEFAULT now()",
+    "ALTER TABLE error_logs ALTER COLUMN last_seen SET DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_error_logs_last_seen ON error_logs (last_seen)",
+    # Versão das linhas usada nos ETags (users, rfid_credentials)
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE rfid_credentials ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    # Perfis de horário compartilhados (time_window_profiles é criada pelo create_all)
+    "ALTER TABLE rfid_credentials ADD COLUMN IF NOT EXISTS time_profile_id UUID REFERENCES time_window_profiles(id)",
+    "CREATE INDEX IF NOT EXISTS ix_rfid_credentials_time_profile_id ON rfid_credentials (time_profile_id)",
+]
+
+def pending_schema_changes(engine) -> list:
+    """Tabelas e colunas dos modelos que ainda não existem no banco"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    pending = []
+    for name, table in Base.metadata.tables.items():
+        if name not in existing_tables:
+            pending.append(name)
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(name)}
+        pending.extend(f"{name}.{column.name}" for column in table.columns if column.name not in existing_columns)
+    return pending
 
 def create_tables():
-    """Criar todas as tabelas"""
-    print("🔧 Criando tabelas no banco de dados...")
+    """Criar tabelas e colunas ausentes (ignorado se o schema já estiver aplicado)"""
+    engine = get_engine()
+    pending = pending_schema_changes(engine)
+    if not pending:
+        print("✅ Tabelas já existem, nada a fazer")
+        return
+
+    print(f"🔧 Aplicando schema no banco de dados: {', '.join(sorted(pending))}...")
     Base.metadata.create_all(bind=engine)
-    print("✅ Tabelas criadas com sucesso!")
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+
+    missing = pending_schema_changes(engine)
+    if missing:
+        raise RuntimeError(f"Schema incompleto, sem alteração cadastrada para: {', '.join(sorted(missing))}")
+    print("✅ Schema aplicado com sucesso!")
 
 if __name__ == "__main__":
     create_tables()